@@ -0,0 +1,84 @@
+"""Admin page: find pairs and scores in the Data and Score sheets.
+
+Served by `annotate.py` when the secrets have an [admin] section:
+
+    [admin]
+    password = "..."
+
+Queries are free words matched against the reference and target sentence, and
+`column:value` filters on dataId, datagroup, user_name and label, e.g.
+`heart disease label:gold` or `user_name:alice`. The index lives in
+`resources.get_search_index()` and picks up new rows on every search.
+
+Below the search, the page reports the active sampler's retirement progress
+(`ActiveSampler.summary()`) and how much working state the sessions of this
+process hold (`SessionRegistry.memory_report()`).
+"""
+import hmac
+import time
+
+import streamlit as st
+
+from resources import current_project, get_sampler, get_search_index, get_session_registry, search_loaders
+
+RESULT_LIMIT = 200
+
+st.title("🔎 Search")
+
+password = st.secrets.get("admin", {}).get("password")
+if not password:
+    st.error("Admin search is not configured.")
+    st.stop()
+
+if not st.session_state.get("admin"):
+    entered = st.text_input("Admin password", type="password")
+    if not hmac.compare_digest(entered.encode(), password.encode()):
+        if entered:
+            st.error("Wrong password.")
+        st.stop()
+    st.session_state.admin = True
+
+project = current_project()
+index = get_search_index(project)
+index.update_in_background(search_loaders(project))  # Only indexes rows added since the last search
+
+tables = list(search_loaders(project))
+table = st.radio("Sheet", tables, horizontal=True)
+query = st.text_input("Query", placeholder="heart disease user_name:alice label:gold datagroup:12")
+
+status = index.status()
+st.caption(
+    f"{status.get(table, 0):,} rows indexed" + (" (indexing...)" if index.is_updating() else "")
+)
+
+if query:
+    try:
+        started = time.perf_counter()
+        results, total = index.search(table, query, RESULT_LIMIT)
+        elapsed = (time.perf_counter() - started) * 1000
+    except ValueError as e:  # Unbalanced quotes
+        st.error(f"Invalid query: {e}")
+    else:
+        shown = f", showing the first {RESULT_LIMIT}" if total > RESULT_LIMIT else ""
+        st.markdown(f"**{total:,} matches** in {elapsed:.1f} ms{shown}")
+        if total:
+            st.dataframe(results, use_container_width=True)
+
+with st.expander("Active sampling"):
+    summary = get_sampler(project).summary()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Rated pairs", f"{summary['rated_pairs']:,} of {summary['pairs']:,}")
+    col2.metric("Retired pairs", f"{summary['retired_pairs']:,}")
+    col3.metric("Ratings per retired pair", f"{summary['ratings_per_retired_pair']:.2f}")
+    col4.metric("Leased pairs", f"{summary['leased_pairs']:,}")
+
+with st.expander("Session memory"):
+    report = get_session_registry().memory_report()
+    col1, col2 = st.columns(2)
+    col1.metric("Sessions", len(report['sessions']))
+    col2.metric("Working state", f"{report['total_bytes'] / 1024:,.1f} KiB")
+    if report['sessions']:
+        largest = sorted(report['sessions'].items(), key=lambda item: -item[1])[:20]
+        st.dataframe(
+            [{'session': session_id[:8], 'bytes': size} for session_id, size in largest], use_container_width=True
+        )
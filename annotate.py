@@ -0,0 +1,31 @@
+"""Serve every annotation task from one Streamlit process.
+
+    streamlit run annotate.py        (or: python warmup.py annotate.py)
+
+Each task in `tasks.py` becomes a page. All pages share the cached backend,
+sheet cache and group store in `resources.py`, so adding a study adds a page,
+not another deployment with its own caches and API quota. `?project=<name>`
+selects one of the projects configured in the secrets (see `projects.py`).
+With an [admin] section in the secrets an admin search page is added
+(`admin_search.py`).
+"""
+import streamlit as st
+
+import task_engine
+from resources import current_project, get_tasks
+
+
+def task_page(name, task):
+    if task['page']:
+        return st.Page(task['page'], title=task['title'], url_path=name)
+
+    def page():
+        task_engine.run(name)
+    page.__name__ = name
+    return st.Page(page, title=task['title'], url_path=name)
+
+
+pages = [task_page(name, task) for name, task in get_tasks(current_project()).items()]
+if "admin" in st.secrets:
+    pages = {"Tasks": pages, "Admin": [st.Page("admin_search.py", title="Search", url_path="search")]}
+st.navigation(pages).run()
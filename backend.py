@@ -0,0 +1,276 @@
+"""Storage backends shared by the apps and the offline tools.
+
+`SheetsBackend` talks to Google Sheets; `LocalBackend` keeps each worksheet as a
+CSV file for local and benchmark runs. `from_config()` picks one from the
+`[backend]` section of the secrets:
+
+    [backend]
+    type = "local"        # default "sheets"
+    path = "local_data"
+
+The Streamlit apps read the secrets from `st.secrets`; offline scripts read the
+same `.streamlit/secrets.toml` through `load_secrets()`. gspread and google-auth
+are only imported when the Sheets backend is actually used.
+"""
+import csv
+import os
+import re
+import threading
+import tomllib
+
+import pandas as pd
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+
+class WorksheetNotFound(KeyError):
+    """Raised by every backend when a worksheet does not exist."""
+
+
+def load_secrets(path=".streamlit/secrets.toml"):
+    """Read the Streamlit secrets file for use outside of Streamlit."""
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def from_config(secrets):
+    """Backend selected by the [backend] section of the secrets (Google Sheets by default)."""
+    config = secrets.get("backend", {})
+    if config.get("type", "sheets") == "local":
+        return LocalBackend(config.get("path", "local_data"))
+    return SheetsBackend.from_secrets(secrets)
+
+
+def records_frame(values):
+    """DataFrame from raw sheet values, typed the same way as `get_all_records()`."""
+    from gspread.utils import numericise_all
+
+    if not values:
+        return pd.DataFrame()
+    header = values[0]
+    width = len(header)
+    rows = [numericise_all(row[:width] + [""] * (width - len(row))) for row in values[1:]]
+    return pd.DataFrame(rows, columns=header)
+
+
+def column_letter(n):
+    """1-based column index to A1 letters (1 -> A, 27 -> AA)."""
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+class SheetsBackend:
+    """Thin wrapper around one spreadsheet, caching the opened worksheets."""
+
+    def __init__(self, client, spreadsheet_url):
+        self.client = client
+        self.spreadsheet_url = spreadsheet_url
+        self._spreadsheet = None
+        self._worksheets = {}
+
+    @classmethod
+    def from_secrets(cls, secrets):
+        import gspread
+        from google.oauth2 import service_account
+
+        credentials = service_account.Credentials.from_service_account_info(
+            secrets["gcp_service_account"],
+            scopes=SCOPES,
+        )
+        return cls(gspread.authorize(credentials), secrets["connections"]["gsheets"]["spreadsheet"])
+
+    @property
+    def spreadsheet(self):
+        if self._spreadsheet is None:
+            self._spreadsheet = self.client.open_by_url(self.spreadsheet_url)
+        return self._spreadsheet
+
+    def worksheet(self, sheetname):
+        import gspread
+
+        if sheetname not in self._worksheets:
+            try:
+                self._worksheets[sheetname] = self.spreadsheet.worksheet(sheetname)
+            except gspread.WorksheetNotFound:
+                raise WorksheetNotFound(sheetname) from None
+        return self._worksheets[sheetname]
+
+    def read(self, sheetname):
+        """Whole worksheet as a DataFrame, with the header row as column names."""
+        return pd.DataFrame(self.worksheet(sheetname).get_all_records())
+
+    def read_many(self, sheetnames):
+        """Several worksheets as DataFrames, fetched together in one batchGet request."""
+        import gspread
+
+        try:
+            response = self.spreadsheet.values_batch_get([f"'{name}'" for name in sheetnames])
+        except gspread.exceptions.APIError as e:
+            # A missing worksheet fails the whole batch with 400 "Unable to parse range: 'Name'"
+            missing = re.search(r"Unable to parse range: '?([^'\n]*)", str(e))
+            if missing is None:
+                raise
+            raise WorksheetNotFound(missing.group(1) or ", ".join(sheetnames)) from None
+        return [records_frame(value_range.get('values', [])) for value_range in response['valueRanges']]
+
+    def header(self, sheetname):
+        return self.worksheet(sheetname).row_values(1)
+
+    def append_rows(self, sheetname, rows):
+        """Append rows below the last row; returns the sheet row number of the last one."""
+        response = self.worksheet(sheetname).append_rows(rows)
+        updated_range = response['updates']['updatedRange']  # e.g. "'Score_0002'!A41:D43"
+        return int(re.search(r"(\d+)$", updated_range).group(1))
+
+    def ensure_sheet(self, sheetname, header):
+        """Create the worksheet with `header` as its first row, unless it already exists."""
+        try:
+            self.worksheet(sheetname)
+        except WorksheetNotFound:
+            worksheet = self.spreadsheet.add_worksheet(sheetname, rows=1, cols=len(header))
+            worksheet.update("A1", [header])
+            self._worksheets[sheetname] = worksheet
+
+    def sibling(self, spreadsheet_url):
+        """Backend for another spreadsheet, sharing this one's authenticated client."""
+        return SheetsBackend(self.client, spreadsheet_url)
+
+    def create_spreadsheet(self, title):
+        """Create a new spreadsheet owned by the service account (share it with the team); returns its URL."""
+        return self.client.create(title).url
+
+    def write_sheet(self, sheetname, rows):
+        """Replace a worksheet's contents with `rows` (header first), creating it if needed."""
+        try:
+            worksheet = self.worksheet(sheetname)
+        except WorksheetNotFound:
+            worksheet = self.spreadsheet.add_worksheet(
+                sheetname, rows=max(len(rows), 1), cols=max(len(rows[0]) if rows else 1, 1)
+            )
+            self._worksheets[sheetname] = worksheet
+        worksheet.clear()
+        if rows:
+            worksheet.update("A1", rows)
+
+    def iter_pages(self, sheetname, start_row=2, page_size=5000, width=None):
+        """Yield (first_row_number, rows) pages of raw cell values, starting at `start_row`.
+
+        Only one page is held in memory at a time. Rows are padded to `width`
+        columns (the header width by default) since Sheets trims trailing blanks.
+        """
+        worksheet = self.worksheet(sheetname)
+        width = width or len(self.header(sheetname))
+        last_col = column_letter(width)
+        row = start_row
+        while True:
+            rows = worksheet.get(f"A{row}:{last_col}{row + page_size - 1}")
+            if not rows:
+                return
+            yield row, [r + [""] * (width - len(r)) for r in rows]
+            if len(rows) < page_size:
+                return
+            row += page_size
+
+
+class LocalWorksheet:
+    """A CSV file standing in for a worksheet; supports the append calls the apps make."""
+
+    def __init__(self, path, lock):
+        self.path = path
+        self._lock = lock
+
+    def append_row(self, row):
+        self.append_rows([row])
+
+    def append_rows(self, rows):
+        with self._lock, open(self.path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+
+    def row_values(self, row_number):
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for i, row in enumerate(csv.reader(f), 1):
+                if i == row_number:
+                    return row
+        return []
+
+
+class LocalBackend:
+    """Worksheets stored as `<path>/<sheetname>.csv`, with the header in the first line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def worksheet(self, sheetname):
+        path = os.path.join(self.path, f"{sheetname}.csv")
+        if not os.path.exists(path):
+            raise WorksheetNotFound(sheetname)
+        return LocalWorksheet(path, self._lock)
+
+    def read(self, sheetname):
+        worksheet = self.worksheet(sheetname)
+        try:
+            # Blank cells stay "" like get_all_records() returns them
+            return pd.read_csv(worksheet.path, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+    def read_many(self, sheetnames):
+        return [self.read(name) for name in sheetnames]
+
+    def header(self, sheetname):
+        return self.worksheet(sheetname).row_values(1)
+
+    def append_rows(self, sheetname, rows):
+        worksheet = self.worksheet(sheetname)
+        with self._lock:
+            with open(worksheet.path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(rows)
+            with open(worksheet.path, newline="", encoding="utf-8") as f:
+                return sum(1 for _ in csv.reader(f))
+
+    def ensure_sheet(self, sheetname, header):
+        path = os.path.join(self.path, f"{sheetname}.csv")
+        with self._lock:
+            if not os.path.exists(path):
+                with open(path, "w", newline="", encoding="utf-8") as f:
+                    csv.writer(f).writerow(header)
+
+    def sibling(self, spreadsheet_url):
+        """Another directory below this one stands in for another spreadsheet."""
+        return LocalBackend(os.path.join(self.path, spreadsheet_url))
+
+    def create_spreadsheet(self, title):
+        os.makedirs(os.path.join(self.path, title), exist_ok=True)
+        return title
+
+    def write_sheet(self, sheetname, rows):
+        path = os.path.join(self.path, f"{sheetname}.csv")
+        with self._lock, open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+
+    def iter_pages(self, sheetname, start_row=2, page_size=5000, width=None):
+        """Same paging contract as `SheetsBackend.iter_pages`."""
+        worksheet = self.worksheet(sheetname)
+        width = width or len(self.header(sheetname))
+        with open(worksheet.path, newline="", encoding="utf-8") as f:
+            rows = csv.reader(f)
+            for _ in range(start_row - 1):
+                if next(rows, None) is None:
+                    return
+            row = start_row
+            while True:
+                page = []
+                for r in rows:
+                    page.append(r[:width] + [""] * (width - len(r)))
+                    if len(page) == page_size:
+                        break
+                if not page:
+                    return
+                yield row, page
+                if len(page) < page_size:
+                    return
+                row += page_size
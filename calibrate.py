@@ -0,0 +1,392 @@
+"""Calibrate the metric scores against human scores and fit a combined predictor.
+
+Each metric score (s1..s3) is mapped onto the human scale of the task that
+writes the Score sheet (its `score_range`: 1-5, or 0-5 for the ranking tasks) with isotonic
+regression and with an ordinal (proportional odds) regression; an ordinal
+regression over all metrics together is the ensemble. Every model is evaluated
+with k-fold cross-validation grouped by pair, the folds running on a process
+pool. The models are then refitted on all rows and saved as a small JSON file
+that can score new pairs: pairs the ensemble is confident about can be scored
+automatically, the rest go to annotators.
+
+    python calibrate.py fit calibration.json --folds 5
+    python calibrate.py fit calibration.json --input exports/scores.parquet
+    python calibrate.py predict calibration.json data_scored.csv predictions.csv
+
+Without `--input`, the latest unflagged Score rows are read from the sheets and
+joined with the Data sheet; a file exported with `export_scores.py
+--with-pair-data` works as well.
+"""
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from backend import WorksheetNotFound, from_config, load_secrets
+from quality import exclude_flagged
+from schema import score_view
+from sharding import shard_scores
+from tasks import configured_tasks, score_sheets
+
+SCORE_COLUMNS = ['s1', 's2', 's3']
+CONFIDENCE_LEVELS = [0.5, 0.6, 0.7, 0.8, 0.9]
+ARTIFACT_VERSION = 1
+
+# Filled in by _init_worker so the training data is shipped once per worker, not per fold
+_worker_state = {}
+
+
+# ===== ISOTONIC REGRESSION =====
+
+def isotonic_fit(x, y):
+    """Non-decreasing fit by pool-adjacent-violators; returns knots {'x', 'y'} to interpolate between."""
+    order = np.argsort(x, kind='stable')
+    x, y = x[order], y[order]
+    values, starts = np.unique(x, return_index=True)
+    sums = np.add.reduceat(y, starts)
+    counts = np.diff(np.append(starts, len(x)))
+
+    blocks = []  # [sum, count, lowest x, highest x]
+    for value, total, count in zip(values, sums, counts):
+        blocks.append([total, count, value, value])
+        # Merge backwards while the block means are not increasing
+        while len(blocks) > 1 and blocks[-2][0] / blocks[-2][1] >= blocks[-1][0] / blocks[-1][1]:
+            total, count, _, high = blocks.pop()
+            blocks[-1][0] += total
+            blocks[-1][1] += count
+            blocks[-1][3] = high
+
+    knots_x, knots_y = [], []
+    for total, count, low, high in blocks:
+        for value in ((low,) if low == high else (low, high)):
+            knots_x.append(float(value))
+            knots_y.append(float(total / count))
+    return {'x': knots_x, 'y': knots_y}
+
+
+def isotonic_predict(model, x):
+    return np.interp(x, model['x'], model['y'])
+
+
+# ===== ORDINAL REGRESSION =====
+
+def _sigmoid(z):
+    return 1 / (1 + np.exp(-z))
+
+
+def _thresholds(c0, gaps):
+    # Cut points kept increasing by construction: the first one plus positive gaps
+    return c0 + np.concatenate(([0.0], np.cumsum(np.exp(gaps))))
+
+
+def ordinal_fit(X, y, levels, l2=1e-3, iterations=800, learning_rate=0.05):
+    """Proportional odds model P(y <= k) = sigmoid(t_k - X w), fitted with Adam on standardized X."""
+    mean, scale = X.mean(axis=0), X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Xs = (X - mean) / scale
+    k = y.astype(int) - levels[0] + 1  # Levels as 1..K
+    n_levels = len(levels)
+
+    # Start from the cut points of the label distribution alone
+    cumulative = np.clip(np.cumsum(np.bincount(k, minlength=n_levels + 1)[1:])[:-1] / len(k), 0.01, 0.99)
+    start = np.log(cumulative / (1 - cumulative))
+    params = np.concatenate((
+        np.zeros(X.shape[1]), [start[0]], np.log(np.maximum(np.diff(start), 0.05))
+    ))
+    moment, velocity = np.zeros_like(params), np.zeros_like(params)
+    n_weights = X.shape[1]
+
+    for step in range(1, iterations + 1):
+        weights, c0, gaps = params[:n_weights], params[n_weights], params[n_weights + 1:]
+        cuts = np.concatenate(([-np.inf], _thresholds(c0, gaps), [np.inf]))
+        eta = Xs @ weights
+        upper, lower = _sigmoid(cuts[k] - eta), _sigmoid(cuts[k - 1] - eta)
+        p = np.maximum(upper - lower, 1e-12)
+        d_upper, d_lower = upper * (1 - upper) / p, lower * (1 - lower) / p
+
+        # Gradient of the mean log-likelihood
+        grad_weights = -Xs.T @ (d_upper - d_lower) / len(k) - l2 * weights
+        grad_cuts = (np.bincount(k, d_upper, n_levels + 1)[1:n_levels]
+                     - np.bincount(k, d_lower, n_levels + 1)[2:n_levels + 1]) / len(k)
+        grad_c0 = grad_cuts.sum()
+        grad_gaps = np.exp(gaps) * np.cumsum(grad_cuts[::-1])[::-1][1:]
+        grad = np.concatenate((grad_weights, [grad_c0], grad_gaps))
+
+        # Adam ascent step
+        moment = 0.9 * moment + 0.1 * grad
+        velocity = 0.999 * velocity + 0.001 * grad ** 2
+        params += learning_rate * (moment / (1 - 0.9 ** step)) / (np.sqrt(velocity / (1 - 0.999 ** step)) + 1e-8)
+
+    return {
+        'mean': mean.tolist(),
+        'scale': scale.tolist(),
+        'weights': params[:n_weights].tolist(),
+        'cuts': _thresholds(params[n_weights], params[n_weights + 1:]).tolist(),
+    }
+
+
+def ordinal_proba(model, X):
+    """Probability of every level of the human scale, one row per pair."""
+    eta = ((X - np.array(model['mean'])) / np.array(model['scale'])) @ np.array(model['weights'])
+    cumulative = _sigmoid(np.array(model['cuts'])[None, :] - eta[:, None])
+    ones = np.ones((len(eta), 1))
+    return np.diff(np.hstack((0 * ones, cumulative, ones)), axis=1)
+
+
+# ===== MODELS =====
+
+def model_specs(columns):
+    """Model name -> (kind, feature columns): isotonic and ordinal per metric, ordinal over all."""
+    specs = {}
+    for column in columns:
+        specs[f"isotonic:{column}"] = ('isotonic', [column])
+        specs[f"ordinal:{column}"] = ('ordinal', [column])
+    specs['ensemble'] = ('ordinal', list(columns))
+    return specs
+
+
+def fit_model(kind, X, y, levels):
+    if kind == 'isotonic':
+        return isotonic_fit(X[:, 0], y)
+    return ordinal_fit(X, y, levels)
+
+
+def predict_model(kind, model, X, levels):
+    """(expected human score, confidence); isotonic fits have no confidence (NaN)."""
+    if kind == 'isotonic':
+        return isotonic_predict(model, X[:, 0]), np.full(len(X), np.nan)
+    proba = ordinal_proba(model, X)
+    return proba @ levels, proba.max(axis=1)
+
+
+# ===== CROSS-VALIDATION =====
+
+def _init_worker(X, y, folds, columns, levels):
+    _worker_state.update(X=X, y=y, folds=folds, columns=columns, levels=levels)
+
+
+def _run_fold(args):
+    name, kind, features, fold = args
+    X, y, folds, columns, levels = (_worker_state[key] for key in ('X', 'y', 'folds', 'columns', 'levels'))
+    X = X[:, [columns.index(feature) for feature in features]]
+    train, test = folds != fold, folds == fold
+    model = fit_model(kind, X[train], y[train], levels)
+    predicted, confidence = predict_model(kind, model, X[test], levels)
+    return name, np.flatnonzero(test), predicted, confidence
+
+
+def pair_folds(data_ids, k, seed=0):
+    """Fold number per row; all ratings of a pair land in the same fold."""
+    pairs = pd.unique(data_ids)
+    fold_of = dict(zip(pairs, np.random.default_rng(seed).permutation(len(pairs)) % k))
+    return np.array([fold_of[data_id] for data_id in data_ids])
+
+
+def _summary(y, predicted, confidence, levels):
+    summary = {
+        'mae': round(float(np.abs(predicted - y).mean()), 4),
+        'rmse': round(float(np.sqrt(((predicted - y) ** 2).mean())), 4),
+        'exact': round(float((np.clip(np.rint(predicted), levels[0], levels[-1]) == y).mean()), 4),
+        'spearman': round(float(pd.Series(predicted).rank().corr(pd.Series(y).rank())), 4),  # No scipy needed
+    }
+    if not np.isnan(confidence).all():
+        # What auto-scoring the confident pairs would cost in accuracy
+        summary['auto_scored'] = {
+            str(level): {
+                'share': round(float((confidence >= level).mean()), 4),
+                'mae': round(float(np.abs(predicted - y)[confidence >= level].mean()), 4)
+                if (confidence >= level).any() else None,
+            }
+            for level in CONFIDENCE_LEVELS
+        }
+    return summary
+
+
+def cross_validate(X, y, data_ids, columns, levels, folds=5, workers=None):
+    """Out-of-fold accuracy of every model, the fold fits spread over a process pool."""
+    fold_ids = pair_folds(data_ids, folds)
+    specs = model_specs(columns)
+    tasks = [(name, kind, features, fold) for name, (kind, features) in specs.items() for fold in range(folds)]
+    if workers == 1:
+        _init_worker(X, y, fold_ids, columns, levels)
+        results = [_run_fold(task) for task in tasks]
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(X, y, fold_ids, columns, levels)) as pool:
+            results = pool.map(_run_fold, tasks)
+
+    predicted = {name: np.empty(len(y)) for name in specs}
+    confidence = {name: np.empty(len(y)) for name in specs}
+    for name, rows, fold_predicted, fold_confidence in results:
+        predicted[name][rows] = fold_predicted
+        confidence[name][rows] = fold_confidence
+    return {name: _summary(y, predicted[name], confidence[name], levels) for name in specs}
+
+
+# ===== ARTIFACT =====
+
+def _rounded(model):
+    return {key: [round(value, 6) for value in values] for key, values in model.items()}
+
+
+class Calibration:
+    """Fitted models loaded from the JSON artifact."""
+
+    def __init__(self, artifact):
+        if artifact.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported calibration artifact version {artifact.get('version')}")
+        self.artifact = artifact
+        self.columns = artifact['columns']
+        self.metrics = artifact['metrics']
+        # Artifacts written before the scale was recorded were all fitted on 1-5
+        self.levels = np.array(artifact.get('levels', [1, 2, 3, 4, 5]))
+        self.min_confidence = artifact['min_confidence']
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.artifact, f, separators=(",", ":"))
+
+    def check_metrics(self, df):
+        """Refuse pairs whose m1..m3 columns name other metrics than the ones calibrated."""
+        for column, metric in self.metrics.items():
+            name_column = "m" + column[1:]
+            if metric and name_column in df.columns:
+                names = set(df[name_column].dropna().astype(str)) - {metric}
+                if names:
+                    raise ValueError(f"{column} was calibrated for {metric}, got {', '.join(sorted(names))}")
+
+    def predict(self, df, min_confidence=None):
+        """Calibrated score per metric, ensemble score and confidence, and whether a human should look."""
+        self.check_metrics(df)
+        min_confidence = self.min_confidence if min_confidence is None else min_confidence
+        X = df[self.columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        out = pd.DataFrame(index=df.index)
+        for i, column in enumerate(self.columns):
+            out[f"calibrated_{column}"] = isotonic_predict(self.artifact['models'][f"isotonic:{column}"], X[:, i])
+        predicted, confidence = predict_model('ordinal', self.artifact['models']['ensemble'], X, self.levels)
+        missing = np.isnan(X).any(axis=1)
+        out['predicted_score'] = np.where(missing, np.nan, predicted.round(3))
+        out['confidence'] = np.where(missing, np.nan, confidence.round(3))
+        out['needs_human'] = missing | (confidence < min_confidence)
+        return out
+
+
+def score_levels(tasks, sheetname="Score"):
+    """Human score levels of the task that writes `sheetname`, from its `score_range`."""
+    for task in tasks.values():
+        if task['score_sheet'] == sheetname:
+            if task['score_range'] is None:
+                raise ValueError(f"{sheetname} holds preferences, not scores")
+            low, high = task['score_range']
+            return np.arange(low, high + 1)
+    raise ValueError(f"No task writes a {sheetname} sheet")
+
+
+def fit_calibration(df, levels, folds=5, workers=None, min_confidence=0.7):
+    """Cross-validate every model, refit on all rows and return the Calibration."""
+    columns = [column for column in SCORE_COLUMNS if column in df.columns]
+    df = df.assign(human_score=pd.to_numeric(df['human_score'], errors='coerce'))
+    df = df.assign(**{column: pd.to_numeric(df[column], errors='coerce') for column in columns})
+    df = df.dropna(subset=columns + ['human_score'])
+    df = df[df['human_score'].isin(levels)]
+    if df['dataId'].nunique() < folds:
+        raise ValueError(f"Need ratings for at least {folds} pairs, got {df['dataId'].nunique()}")
+
+    X = df[columns].to_numpy(dtype=float)
+    y = df['human_score'].to_numpy(dtype=float)
+    report = cross_validate(X, y, df['dataId'].astype(str).to_numpy(), columns, levels, folds, workers)
+    models = {
+        name: _rounded(fit_model(kind, X[:, [columns.index(f) for f in features]], y, levels))
+        for name, (kind, features) in model_specs(columns).items()
+    }
+    metrics = {}
+    for column in columns:
+        name_column = "m" + column[1:]
+        names = df[name_column].dropna().astype(str) if name_column in df.columns else pd.Series(dtype=str)
+        metrics[column] = names.mode().iloc[0] if len(names) else None
+    return Calibration({
+        'version': ARTIFACT_VERSION,
+        'columns': columns,
+        'metrics': metrics,
+        'levels': [int(level) for level in levels],
+        'min_confidence': min_confidence,
+        'rows': len(df),
+        'pairs': int(df['dataId'].nunique()),
+        'models': models,
+        'cv': report,
+    })
+
+
+# ===== INPUT =====
+
+def read_table(path):
+    if path.endswith(".parquet") or os.path.isdir(path):
+        return pd.read_parquet(path)  # A file or a partitioned export directory
+    if path.endswith(".jsonl"):
+        return pd.read_json(path, lines=True, dtype={'dataId': str})
+    return pd.read_csv(path, dtype={'dataId': str})
+
+
+def sheet_scores(secrets, sheetname="Score"):
+    """Latest unflagged Score rows joined with the Data sheet."""
+    backend = from_config(secrets)
+    # Every task's Score sheet is sharded on its own, as in the app
+    tables = score_sheets(configured_tasks(secrets.get("tasks", {})))
+    scores = shard_scores(backend, secrets.get("score_shards", {}), tables).read(sheetname)
+    try:
+        flagged = backend.read("Flagged")
+    except WorksheetNotFound:
+        flagged = None
+    return score_view(exclude_flagged(scores, flagged), backend.read("Data"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate metric scores against human scores.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fit = commands.add_parser("fit", help="Cross-validate, fit and save the calibration")
+    fit.add_argument("artifact", help="JSON file to write")
+    fit.add_argument("--input", help="Exported Score rows with pair data (parquet/jsonl/csv) instead of the sheets")
+    fit.add_argument("--sheet", default="Score",
+                     help="Score worksheet to read (or the --input rows came from); its task sets the scale")
+    fit.add_argument("--folds", type=int, default=5)
+    fit.add_argument("--workers", type=int, default=None, help="Worker processes (default: all CPUs)")
+    fit.add_argument("--min-confidence", type=float, default=0.7,
+                     help="Ensemble confidence below which a pair still needs a human")
+    fit.add_argument("--secrets", default=".streamlit/secrets.toml")
+
+    predict = commands.add_parser("predict", help="Score pairs with a saved calibration")
+    predict.add_argument("artifact")
+    predict.add_argument("input", help="CSV with s1..s3 columns, e.g. from compute_metrics.py")
+    predict.add_argument("output", help="CSV to write with the predictions added")
+    predict.add_argument("--min-confidence", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        # With --input the secrets are optional; they only matter when they override a task's score range
+        secrets = load_secrets(args.secrets) if not args.input or os.path.exists(args.secrets) else {}
+        levels = score_levels(configured_tasks(secrets.get("tasks", {})), args.sheet)
+        df = read_table(args.input) if args.input else sheet_scores(secrets, args.sheet)
+        calibration = fit_calibration(df, levels, args.folds, args.workers, args.min_confidence)
+        calibration.save(args.artifact)
+        print(json.dumps(calibration.artifact['cv'], indent=2))
+        print(f"Fitted on {calibration.artifact['rows']} ratings of {calibration.artifact['pairs']} pairs "
+              f"-> {args.artifact}")
+    else:
+        calibration = Calibration.load(args.artifact)
+        df = pd.read_csv(args.input, dtype={'dataId': str})
+        predictions = calibration.predict(df, args.min_confidence)
+        pd.concat([df, predictions], axis=1).to_csv(args.output, index=False)
+        print(f"{int((~predictions['needs_human']).sum())} of {len(df)} pairs scored automatically, "
+              f"{int(predictions['needs_human'].sum())} need a human -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
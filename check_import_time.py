@@ -0,0 +1,101 @@
+"""Import-time budget check for the modules every app rerun and local deployment loads.
+
+Each module is imported in a fresh interpreter with a local backend configured;
+the check fails if an import takes longer than the budget or pulls in the
+Google Sheets stack (gspread, google-auth), which `backend.py` only loads when
+the Sheets backend is used.
+
+Streamlit is replaced by a stub (the cache decorators pass functions through,
+everything else is a no-op), so the budget covers the app's own modules and not
+Streamlit's, and the check runs where Streamlit is not installed. The page
+scripts draw their UI at import, so only their import statements are run.
+
+    python check_import_time.py
+    python check_import_time.py --budget 0.8 --repeat 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    'backend', 'local_store', 'sharding', 'projects', 'schema', 'sheet_cache', 'group_store', 'sampler',
+    'quality', 'tasks', 'monitoring', 'resources', 'task_engine', 'warmup',
+]
+PAGES = ['streamlit_app', 'annotate', 'admin_search', 'streamlit_app_v0', 'streamlit_app_v1', 'streamlit_app_v2']
+SHEETS_PACKAGES = ('gspread', 'google.auth', 'google.oauth2')
+
+STREAMLIT_STUB = """
+def _cache(func=None, **options):
+    return func if func is not None else _cache
+st = types.ModuleType('streamlit')
+st.cache_resource = st.cache_data = _cache
+st.secrets, st.session_state = {}, {}
+st.__getattr__ = lambda name: lambda *args, **kwargs: None
+sys.modules['streamlit'] = st
+"""
+
+# A page's import statements, compiled before the clock starts
+PAGE_IMPORTS = """
+tree = ast.parse(open({path!r}, encoding='utf-8').read())
+code = compile(ast.Module([node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))], []),
+               {path!r}, 'exec')
+"""
+
+PROBE = """
+import ast, json, sys, tempfile, time, types
+{setup}
+started = time.perf_counter()
+{load}
+elapsed = time.perf_counter() - started
+import backend
+backend.from_config({{'backend': {{'type': 'local', 'path': tempfile.mkdtemp()}}}})
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def import_time(module):
+    """(seconds, Sheets packages loaded) for importing `module` in a fresh interpreter."""
+    if module in PAGES:
+        setup = STREAMLIT_STUB + PAGE_IMPORTS.format(path=f"{module}.py")
+        load = "exec(code, {'__name__': '__page__'})"
+    else:
+        setup, load = STREAMLIT_STUB, f"import {module}"
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(setup=setup, load=load)], capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    loaded = [name for name in result['modules'] if name.startswith(SHEETS_PACKAGES)]
+    return result['seconds'], loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the app modules against a budget.")
+    parser.add_argument("modules", nargs="*", default=MODULES + PAGES,
+                        help="Modules or pages to check (default: the app's core and every page)")
+    parser.add_argument("--budget", type=float, default=1.0, help="Most seconds one import may take")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per module; the fastest counts")
+    args = parser.parse_args()
+
+    failed = []
+    for module in args.modules:
+        # The fastest run is the least disturbed by other load on the machine
+        runs = [import_time(module) for _ in range(args.repeat)]
+        seconds = min(run[0] for run in runs)
+        loaded = runs[0][1]
+        problems = []
+        if seconds > args.budget:
+            problems.append(f"over the {args.budget}s budget")
+        if loaded:
+            problems.append(f"imports {', '.join(loaded)}")
+        print(f"{module:<18} {seconds:6.3f}s  {'; '.join(problems) or 'ok'}")
+        if problems:
+            failed.append(module)
+
+    if failed:
+        print(f"FAILED: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Offline batch computation of CPU similarity metrics for (reference, sentence) pairs.
+
+Reads a CSV export of the Data sheet (or any file with `reference` and `sentence`
+columns), scores every pair and writes the result back with the m1..m3 / s1..s3
+columns filled in, ready to be imported into the Data sheet.
+
+    python compute_metrics.py data.csv data_scored.csv --metrics token_f1 bleu rouge_l
+"""
+import argparse
+import math
+import re
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+TOKEN_RE = re.compile(r"\w+")
+HASH_MULT = np.uint64(1000003)
+
+# Filled in by _init_worker so the idf table is shipped once per worker, not per chunk
+_worker_state = {}
+
+
+# ===== TOKENIZATION =====
+
+def tokenize_texts(texts):
+    """Tokenize each distinct text once and map tokens to integer ids.
+
+    Returns (codes, token_ids, vocab_size) where `codes` maps every input text to an
+    entry of `token_ids`, so repeated references are only tokenized a single time.
+    """
+    codes, uniques = pd.factorize(pd.Series(texts, dtype=object).fillna("").astype(str))
+    vocab = {}
+    token_ids = []
+    for text in uniques:
+        ids = [vocab.setdefault(tok, len(vocab)) for tok in TOKEN_RE.findall(text.lower())]
+        token_ids.append(np.asarray(ids, dtype=np.uint64))
+    return codes, token_ids, len(vocab)
+
+
+def compute_idf(token_ids, vocab_size):
+    """Smoothed inverse document frequency over the distinct texts."""
+    df = np.zeros(vocab_size, dtype=np.float64)
+    for ids in token_ids:
+        df[np.unique(ids).astype(np.int64)] += 1
+    n_docs = len(token_ids)
+    return np.log((1 + n_docs) / (1 + df)) + 1
+
+
+# ===== N-GRAM COUNTING =====
+
+def ngrams(ids, n):
+    """Hash all n-grams of an id array into one uint64 array."""
+    if len(ids) < n:
+        return np.empty(0, dtype=np.uint64)
+    codes = ids[: len(ids) - n + 1].copy()
+    for k in range(1, n):
+        codes = codes * HASH_MULT + ids[k: len(ids) - n + 1 + k] + np.uint64(1)
+    return codes
+
+
+def clipped_overlap(a, b):
+    """Number of n-grams shared by `a` and `b`, clipped to the count in each."""
+    if len(a) == 0 or len(b) == 0:
+        return 0
+    ua, ca = np.unique(a, return_counts=True)
+    ub, cb = np.unique(b, return_counts=True)
+    _, ia, ib = np.intersect1d(ua, ub, assume_unique=True, return_indices=True)
+    return int(np.minimum(ca[ia], cb[ib]).sum())
+
+
+def f_score(matches, hyp_total, ref_total, beta=1.0):
+    if matches == 0 or hyp_total == 0 or ref_total == 0:
+        return 0.0
+    precision = matches / hyp_total
+    recall = matches / ref_total
+    b2 = beta * beta
+    return (1 + b2) * precision * recall / (b2 * precision + recall)
+
+
+# ===== METRICS =====
+# Every metric takes (reference ids, sentence ids, reference text, sentence text)
+# and returns a score in [0, 1].
+
+def token_f1(ref, hyp, ref_text, hyp_text):
+    return f_score(clipped_overlap(ref, hyp), len(hyp), len(ref))
+
+
+def bleu(ref, hyp, ref_text, hyp_text, max_n=4):
+    """Sentence BLEU with add-one smoothing for n > 1."""
+    if len(hyp) == 0 or len(ref) == 0:
+        return 0.0
+    log_precision = 0.0
+    for n in range(1, max_n + 1):
+        matches = clipped_overlap(ngrams(ref, n), ngrams(hyp, n))
+        total = max(len(hyp) - n + 1, 0)
+        if n > 1:
+            matches, total = matches + 1, total + 1
+        if matches == 0:
+            return 0.0
+        log_precision += math.log(matches / total) / max_n
+    brevity = min(0.0, 1 - len(ref) / len(hyp))
+    return math.exp(log_precision + brevity)
+
+
+def _char_ids(text):
+    return np.frombuffer(re.sub(r"\s+", "", text).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+
+def chrf(ref, hyp, ref_text, hyp_text, max_n=6, beta=2.0):
+    """Character n-gram F-score (chrF, beta=2)."""
+    ref_chars, hyp_chars = _char_ids(ref_text), _char_ids(hyp_text)
+    scores = []
+    for n in range(1, max_n + 1):
+        r, h = ngrams(ref_chars, n), ngrams(hyp_chars, n)
+        if len(r) == 0 or len(h) == 0:
+            break
+        scores.append(f_score(clipped_overlap(r, h), len(h), len(r), beta))
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+def lcs_length(a, b):
+    """Length of the longest common subsequence using the bit-parallel algorithm."""
+    if len(a) == 0 or len(b) == 0:
+        return 0
+    masks = {}
+    for i, tok in enumerate(b.tolist()):
+        masks[tok] = masks.get(tok, 0) | (1 << i)
+    full = (1 << len(b)) - 1
+    v = full
+    for tok in a.tolist():
+        u = v & masks.get(tok, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(b) - bin(v).count("1")
+
+
+def rouge_l(ref, hyp, ref_text, hyp_text):
+    return f_score(lcs_length(ref, hyp), len(hyp), len(ref))
+
+
+def tfidf_cosine(ref, hyp, ref_text, hyp_text):
+    if len(ref) == 0 or len(hyp) == 0:
+        return 0.0
+    idf = _worker_state["idf"]
+    ur, cr = np.unique(ref, return_counts=True)
+    uh, ch = np.unique(hyp, return_counts=True)
+    wr = cr * idf[ur.astype(np.int64)]
+    wh = ch * idf[uh.astype(np.int64)]
+    _, ir, ih = np.intersect1d(ur, uh, assume_unique=True, return_indices=True)
+    dot = float(np.dot(wr[ir], wh[ih]))
+    return dot / float(np.linalg.norm(wr) * np.linalg.norm(wh))
+
+
+METRICS = {
+    "token_f1": token_f1,
+    "bleu": bleu,
+    "chrf": chrf,
+    "rouge_l": rouge_l,
+    "tfidf_cosine": tfidf_cosine,
+}
+
+
+# ===== PIPELINE =====
+
+def _init_worker(idf):
+    _worker_state["idf"] = idf
+
+
+def _score_chunk(args):
+    metric_names, refs, hyps, ref_texts, hyp_texts = args
+    funcs = [METRICS[name] for name in metric_names]
+    out = np.empty((len(refs), len(funcs)), dtype=np.float64)
+    for i, (r, h, rt, ht) in enumerate(zip(refs, hyps, ref_texts, hyp_texts)):
+        for j, func in enumerate(funcs):
+            out[i, j] = func(r, h, rt, ht)
+    return out
+
+
+def compute_metrics(df, metric_names, workers=None, chunksize=2000):
+    """Score every (reference, sentence) row of `df`; returns one column per metric."""
+    unknown = [name for name in metric_names if name not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+
+    n = len(df)
+    if n == 0:
+        return pd.DataFrame(columns=list(metric_names), index=df.index, dtype=np.float64)
+    texts = pd.concat([df["reference"], df["sentence"]], ignore_index=True).fillna("").astype(str)
+    codes, token_ids, vocab_size = tokenize_texts(texts)
+    idf = compute_idf(token_ids, vocab_size)
+    ref_codes, hyp_codes = codes[:n], codes[n:]
+    texts = texts.tolist()
+
+    chunks = []
+    for start in range(0, n, chunksize):
+        stop = min(start + chunksize, n)
+        chunks.append((
+            list(metric_names),
+            [token_ids[c] for c in ref_codes[start:stop]],
+            [token_ids[c] for c in hyp_codes[start:stop]],
+            texts[start:stop],
+            texts[n + start: n + stop],
+        ))
+
+    if workers == 1 or len(chunks) == 1:
+        _init_worker(idf)
+        results = [_score_chunk(chunk) for chunk in chunks]
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(idf,)) as pool:
+            results = pool.map(_score_chunk, chunks)
+
+    return pd.DataFrame(np.vstack(results), columns=list(metric_names), index=df.index)
+
+
+def fill_metric_columns(df, scores):
+    """Write metric names/scores into the m1..mN / s1..sN columns used by the Data sheet."""
+    df = df.copy()
+    for i, name in enumerate(scores.columns, 1):
+        df[f"m{i}"] = name
+        df[f"s{i}"] = scores[name].round(4)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute similarity metrics for the Data sheet.")
+    parser.add_argument("input", help="CSV with reference and sentence columns")
+    parser.add_argument("output", help="CSV to write with m1..mN / s1..sN filled in")
+    parser.add_argument("--metrics", nargs="+", default=["token_f1", "bleu", "rouge_l"],
+                        choices=sorted(METRICS), help="Metrics to compute, in m1..mN order")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all CPUs)")
+    parser.add_argument("--chunksize", type=int, default=2000, help="Rows per worker task")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    scores = compute_metrics(df, args.metrics, workers=args.workers, chunksize=args.chunksize)
+    fill_metric_columns(df, scores).to_csv(args.output, index=False)
+    print(f"Scored {len(df)} pairs with {', '.join(args.metrics)} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Near-duplicate (reference, sentence) pairs, so each one is only annotated once.
+
+Pairs are normalized (case, accents, punctuation, whitespace), cut into word
+bigrams and summarized by a MinHash signature; signatures are split into LSH
+bands, so only pairs that share a band are ever compared. Signatures are
+computed a chunk of rows at a time and only those of cluster representatives
+are kept, so the index grows with the number of distinct pairs. The Data sheet
+itself is read whole and validated like the app does (`sheet_data()`), so both
+cluster the same rows; only a CSV given to the CLI is read chunk by chunk.
+
+Every row joins the first earlier representative whose estimated Jaccard
+similarity reaches `threshold`, or becomes a representative itself. The sampler
+only hands out representatives (their scores count for the whole cluster) and
+`propagate_scores()` copies a representative's scores onto its duplicates.
+
+Opt in for the app with a [dedup] section in the secrets:
+
+    [dedup]
+    threshold = 0.8
+
+    python dedup.py --csv data.csv     # Savings report for a file
+    python dedup.py                    # ... or for the Data sheet
+"""
+import argparse
+import json
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from backend import from_config, load_secrets
+from schema import validate_data
+
+DEFAULT_THRESHOLD = 0.8
+PRIME = (1 << 32) - 5  # Largest prime below 2**32
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    """Lowercase words without accents or punctuation."""
+    text = str(text).lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return WORD_PATTERN.findall(text)
+
+
+def shingles(reference, sentence):
+    """CRC32 hashes of the word bigrams of both sides, tagged so the two sides never match each other."""
+    hashes = []
+    for tag, text in (('r', reference), ('s', sentence)):
+        words = normalize_text(text)
+        grams = [" ".join(words[i:i + 2]) for i in range(max(1, len(words) - 1))]
+        hashes += [zlib.crc32(f"{tag}\x1f{gram}".encode()) for gram in grams]
+    return hashes
+
+
+class DuplicateIndex:
+    """Clusters of near-duplicate pairs, built incrementally with `add()`."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=64, bands=8, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)  # a * hash stays below 2**63
+        self._b = rng.integers(0, PRIME, num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 1 << 63, (bands, num_perm // bands), dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]  # band key -> representative number
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.representatives = []  # dataId of each representative
+        self.representative = {}  # duplicate dataId -> its representative's dataId
+        self.rows = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            threshold=config.get('threshold', DEFAULT_THRESHOLD),
+            num_perm=config.get('num_perm', 64),
+            bands=config.get('bands', 8),
+        )
+
+    def signatures(self, references, sentences):
+        """MinHash signature (num_perm uint32 values) of every pair."""
+        rows = [shingles(r, s) for r, s in zip(references, sentences)]
+        lengths = np.array([len(h) for h in rows])
+        hashes = np.fromiter((h for row in rows for h in row), dtype=np.uint64, count=lengths.sum())
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        values = (hashes[:, None] * self._a + self._b) % PRIME
+        return np.minimum.reduceat(values, offsets, axis=0).astype(np.uint32)
+
+    def _band_keys(self, signatures):
+        bands = signatures.astype(np.uint64).reshape(len(signatures), self.bands, -1)
+        # Wrapping multiply-add of each band's values; equal bands give equal keys
+        return (bands * self._band_mix).sum(axis=2).tolist()
+
+    def _add_representative(self, data_id, signature, keys):
+        number = len(self.representatives)
+        if number == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[number] = signature
+        self.representatives.append(data_id)
+        for bucket, key in zip(self._buckets, keys):
+            bucket.setdefault(key, number)
+
+    def add(self, chunk):
+        """Cluster a DataFrame chunk with dataId, reference and sentence columns."""
+        if chunk.empty:
+            return
+        signatures = self.signatures(chunk['reference'].tolist(), chunk['sentence'].tolist())
+        for data_id, signature, keys in zip(chunk['dataId'].astype(str), signatures, self._band_keys(signatures)):
+            match = None
+            for bucket, key in zip(self._buckets, keys):
+                number = bucket.get(key)
+                # Bands can collide on dissimilar pairs; confirm with the whole signature
+                if number is not None and (self._signatures[number] == signature).mean() >= self.threshold:
+                    match = number
+                    break
+            if match is None:
+                self._add_representative(data_id, signature, keys)
+            else:
+                self.representative[data_id] = self.representatives[match]
+        self.rows += len(chunk)
+
+    def members(self):
+        """Representative dataId -> the dataIds of its duplicates."""
+        clusters = {}
+        for data_id, representative in self.representative.items():
+            clusters.setdefault(representative, []).append(data_id)
+        return clusters
+
+    def report(self, ratings_per_pair=None):
+        """How many pairs the clustering saves from annotation."""
+        sizes = [len(members) + 1 for members in self.members().values()]
+        report = {
+            'pairs': self.rows,
+            'representatives': len(self.representatives),
+            'duplicates': len(self.representative),
+            'clusters_with_duplicates': len(sizes),
+            'largest_cluster': max(sizes, default=1),
+            'saved_fraction': round(len(self.representative) / self.rows, 4) if self.rows else 0.0,
+        }
+        if ratings_per_pair:
+            report['ratings_saved'] = len(self.representative) * ratings_per_pair
+        return report
+
+
+def find_duplicates(chunks, config=None):
+    """Build a DuplicateIndex over an iterable of Data chunks."""
+    index = DuplicateIndex.from_config(config or {})
+    for chunk in chunks:
+        index.add(chunk)
+    return index
+
+
+def data_chunks(df, chunk_size=5000):
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def propagate_scores(scores, index):
+    """Score rows plus a copy of every representative's rows for each of its duplicates.
+
+    Copies get the duplicate's dataId and the representative's in `duplicate_of`
+    (empty on the original rows). They come first, so `latest_scores()` prefers a
+    score given to the duplicate itself.
+    """
+    links = pd.DataFrame(
+        [(representative, data_id) for representative, members in index.members().items() for data_id in members],
+        columns=['dataId', 'duplicate'],
+    )
+    scores = scores.assign(dataId=scores['dataId'].astype(str))
+    copies = scores.merge(links, on='dataId')
+    copies = copies.assign(duplicate_of=copies['dataId'], dataId=copies['duplicate']).drop(columns=['duplicate'])
+    return pd.concat([copies, scores.assign(duplicate_of=pd.NA)], ignore_index=True)
+
+
+def sheet_data(backend, sheetname="Data"):
+    """The validated Data sheet: the rows the app clusters, so both pick the same representatives.
+
+    Read whole, typed like the app reads it: quarantine takes whole datagroups
+    (see `schema.validate_data()`).
+    """
+    valid, _ = validate_data(backend.read(sheetname))
+    return valid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report near-duplicate pairs in the Data sheet.")
+    parser.add_argument("--csv", help="Read pairs from a CSV file instead of the Data sheet")
+    parser.add_argument("--threshold", type=float, default=None, help="Minimum estimated Jaccard similarity")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows hashed at a time (and read at a time from --csv)")
+    parser.add_argument("--clusters", action="store_true", help="Also list every cluster")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    args = parser.parse_args()
+
+    secrets = load_secrets(args.secrets) if not args.csv else {}
+    config = dict(secrets.get("dedup", {}))
+    if args.threshold is not None:
+        config['threshold'] = args.threshold
+    if args.csv:
+        chunks = pd.read_csv(args.csv, dtype=str, chunksize=args.chunk_size, keep_default_na=False)
+    else:
+        chunks = data_chunks(sheet_data(from_config(secrets)), args.chunk_size)
+    index = find_duplicates(chunks, config)
+    output = index.report()
+    if args.clusters:
+        output['clusters'] = index.members()
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Incremental export of the Score sheet to partitioned Parquet or JSONL.
+
+Rows are streamed from the sheet one page at a time and written out as they
+arrive, so memory use does not grow with the sheet. A checkpoint in the output
+directory records the next unexported row and the header of every Score shard
+(see `sharding.py`); repeat runs only fetch new rows. A shard whose header
+changed since the last run (e.g. after `migrate_scores.py`) is exported again
+from the start.
+
+    python export_scores.py exports/ --format parquet --partition-by datagroup
+
+The export is append-only. Progressive commits (see `progressive.py`) write an
+edited score as a new row, and an edit that lands after its original was
+exported ends up in a later page, so the export can hold several rows per
+(datagroup, user_name, dataId). Each page only keeps its own latest rows;
+readers of the pages must keep the last row per key themselves, in shard order
+and then by the row number in the file name. `--latest PATH` does this once
+more over everything exported so far and writes the result to PATH:
+
+    python export_scores.py exports/ --latest scores_latest.parquet
+
+Score rows only reference pairs by dataId; `--with-pair-data` joins the pair
+text, label and metric scores from the Data sheet into the export.
+`--propagate-duplicates` also exports every score of a representative pair for
+each of its near-duplicates (see `dedup.py`).
+
+Scores from sessions in the Flagged sheet are left out, as in the app's
+aggregates and `calibrate.py` (see `quality.py`). A session is flagged right
+after its Score rows are written, so a run in between can still export them.
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import re
+
+import pandas as pd
+
+from backend import WorksheetNotFound, from_config, load_secrets
+from dedup import data_chunks, find_duplicates, propagate_scores, sheet_data
+from quality import exclude_flagged
+from schema import latest_scores, score_view
+from sharding import shard_sources
+
+CHECKPOINT_FILE = "_checkpoint.json"
+
+# Typed schema for the columns the submit code writes; anything else is exported as a string
+SCORE_SCHEMA = {
+    'datagroup': 'Int64',
+    'user_name': 'string',
+    'dataId': 'string',
+    'reference': 'string',
+    'sentence': 'string',
+    'label': 'string',
+    'm1': 'string',
+    's1': 'Float64',
+    'm2': 'string',
+    's2': 'Float64',
+    'm3': 'string',
+    's3': 'Float64',
+    'A_rank': 'Int64',
+    'B_rank': 'Int64',
+    'C_rank': 'Int64',
+    'human_score': 'Int64',
+}
+
+
+def coerce_scores(rows, header):
+    """Build a typed DataFrame from raw sheet values; unparseable numbers become NA."""
+    page = pd.DataFrame(rows, columns=header)
+    for column in page.columns:
+        dtype = SCORE_SCHEMA.get(column, 'string')
+        if dtype == 'string':
+            page[column] = page[column].astype('string')
+        else:
+            numbers = pd.to_numeric(page[column].replace('', None), errors='coerce')
+            if dtype == 'Int64':
+                numbers = numbers.round()
+            page[column] = numbers.astype(dtype)
+    return page
+
+
+def read_checkpoint(out_dir, sheetname="Score"):
+    """{'shards': {worksheet: {'next_row', 'header'}}}; single-sheet checkpoints are upgraded."""
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {'shards': {}}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if 'shards' not in checkpoint:
+        checkpoint = {'shards': {sheetname: checkpoint}}
+    return checkpoint
+
+
+def write_checkpoint(out_dir, checkpoint):
+    # Write-then-rename so an interrupted run never leaves a half-written checkpoint
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def write_page(page, out_dir, fmt, partition_by, first_row, export_date, prefix="part"):
+    """Write one page, split into `partition=value/` directories when partitioning."""
+    if partition_by == 'date':
+        groups = [(export_date, page)]
+    elif partition_by == 'datagroup':
+        groups = page.groupby(page['datagroup'].fillna(-1), sort=False)
+    else:
+        groups = [(None, page)]
+
+    for value, part in groups:
+        directory = out_dir if partition_by is None else os.path.join(out_dir, f"{partition_by}={value}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{prefix}-{first_row:09d}.{fmt}")
+        if fmt == 'parquet':
+            # Hive-style readers restore the partition column from the directory name
+            part.drop(columns=[partition_by], errors='ignore').to_parquet(path, index=False)
+        else:
+            part.to_json(path, orient='records', lines=True, force_ascii=False)
+
+
+def remove_pages(out_dir, prefix):
+    """Delete the exported pages of one shard, in every partition."""
+    for path in glob.glob(os.path.join(glob.escape(out_dir), "**", f"{glob.escape(prefix)}-*.*"), recursive=True):
+        os.remove(path)
+
+
+def pair_data(backend):
+    """Data sheet columns to join onto exported Score rows, typed like the Score schema."""
+    data = backend.read("Data")
+    return coerce_scores(data.astype(str).values.tolist(), list(data.columns))
+
+
+def load_flagged(backend):
+    try:
+        return backend.read("Flagged")
+    except WorksheetNotFound:
+        return None
+
+
+def export_scores(backend, out_dir, fmt='parquet', partition_by=None, sheetname="Score", page_size=5000,
+                  with_pair_data=False, duplicates=None):
+    """Export rows added since the last run; returns the number of rows written.
+
+    `duplicates` is a `dedup.DuplicateIndex` whose representatives' scores are
+    copied onto their duplicates.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = read_checkpoint(out_dir, sheetname)
+    export_date = datetime.date.today().isoformat()
+    data = pair_data(backend) if with_pair_data else None
+    flagged = load_flagged(backend)
+
+    exported = 0
+    for shard_backend, shard in shard_sources(backend, sheetname):
+        position = checkpoint['shards'].setdefault(shard, {'next_row': 2})
+        header = shard_backend.header(shard)
+        # The original sheet keeps the old file names so earlier exports stay consistent
+        prefix = "part" if shard == sheetname else f"{shard}-part"
+        if position.get('header') not in (None, header):
+            # The sheet was rewritten; rows exported under the old columns no longer match it
+            remove_pages(out_dir, prefix)
+            position = checkpoint['shards'][shard] = {'next_row': 2}
+        for first_row, rows in shard_backend.iter_pages(shard, position['next_row'], page_size, len(header)):
+            page = latest_scores(exclude_flagged(coerce_scores(rows, header), flagged))
+            if duplicates is not None:
+                page = propagate_scores(page, duplicates)
+            if data is not None:
+                page = score_view(page, data)
+            write_page(page, out_dir, fmt, partition_by, first_row, export_date, prefix)
+            exported += len(rows)
+            checkpoint['shards'][shard] = {'next_row': first_row + len(rows), 'header': header}
+            write_checkpoint(out_dir, checkpoint)
+    return exported
+
+
+def read_page(path, fmt):
+    """One exported page, with the partition column restored from its directory name."""
+    if fmt == 'parquet':
+        page = pd.read_parquet(path)
+    else:
+        page = pd.read_json(path, lines=True, dtype={'dataId': str, 'user_name': str})
+    column, sep, value = os.path.basename(os.path.dirname(path)).partition("=")
+    if sep and column not in page.columns:
+        page[column] = pd.NA if value == "-1" else value
+    return page
+
+
+def compact_latest(backend, out_dir, path, fmt='parquet', sheetname="Score"):
+    """Write the last exported row per (datagroup, user_name, dataId) to `path`; returns the row count.
+
+    Loads the whole export, so it is a separate pass rather than part of the
+    incremental run.
+    """
+    pages = []
+    for _, shard in shard_sources(backend, sheetname):
+        prefix = "part" if shard == sheetname else f"{shard}-part"
+        paths = glob.glob(os.path.join(glob.escape(out_dir), "**", f"{glob.escape(prefix)}-*.{fmt}"), recursive=True)
+        # Later rows of the sheet are later edits
+        for page_path in sorted(paths, key=lambda p: int(re.search(r"-(\d+)\.\w+$", p).group(1))):
+            pages.append(read_page(page_path, fmt))
+    if not pages:
+        return 0
+    latest = latest_scores(pd.concat(pages, ignore_index=True))
+    if 'datagroup' in latest.columns:
+        latest = latest.assign(datagroup=pd.to_numeric(latest['datagroup'], errors='coerce').astype('Int64'))
+    if fmt == 'parquet':
+        latest.to_parquet(path, index=False)
+    else:
+        latest.to_json(path, orient='records', lines=True, force_ascii=False)
+    return len(latest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Score sheet incrementally.")
+    parser.add_argument("out_dir", help="Directory for the export and its checkpoint")
+    parser.add_argument("--format", choices=["parquet", "jsonl"], default="parquet")
+    parser.add_argument("--partition-by", choices=["datagroup", "date"], default=None)
+    parser.add_argument("--sheet", default="Score", help="Worksheet to export")
+    parser.add_argument("--page-size", type=int, default=5000, help="Rows fetched per request")
+    parser.add_argument("--with-pair-data", action="store_true", help="Join pair text and metric scores from the Data sheet")
+    parser.add_argument("--propagate-duplicates", action="store_true",
+                        help="Copy scores onto near-duplicate pairs, clustered as set in [dedup]")
+    parser.add_argument("--latest", metavar="PATH",
+                        help="Also write the last row per (datagroup, user_name, dataId) of the whole export here")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    args = parser.parse_args()
+
+    secrets = load_secrets(args.secrets)
+    backend = from_config(secrets)
+    duplicates = None
+    if args.propagate_duplicates:
+        duplicates = find_duplicates(data_chunks(sheet_data(backend)), secrets.get("dedup", {}))
+    exported = export_scores(backend, args.out_dir, args.format, args.partition_by, args.sheet, args.page_size,
+                             args.with_pair_data, duplicates)
+    print(f"Exported {exported} new rows to {args.out_dir}")
+    if args.latest:
+        rows = compact_latest(backend, args.out_dir, args.latest, args.format, args.sheet)
+        print(f"Wrote {rows} latest rows to {args.latest}")
+
+
+if __name__ == "__main__":
+    main()
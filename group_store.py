@@ -0,0 +1,126 @@
+"""Process-wide, read-only group data and per-session working state.
+
+Every session used to keep its own DataFrame copy of the group it was annotating.
+Rows now live once in a shared `GroupStore`; a session only keeps the ids of its
+samples, its cursor and its answers, in a `SessionRegistry` that can report how
+much memory each session holds (shown on the admin page) and evict sessions
+that have gone idle.
+"""
+import sys
+import threading
+import time
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+ROW_CACHE_SIZE = 4096  # Rows kept as Python mappings; the rest stay in the compact frame
+
+
+class GroupStore:
+    """Immutable rows indexed by dataId and datagroup, shared by all sessions.
+
+    Rows stay in the compact Data frame (see `schema.compact_data()`); a row
+    becomes a read-only mapping only when it is asked for, and only the most
+    recently asked ones are kept.
+    """
+
+    def __init__(self, df, extra_records=()):
+        self._frame = df
+        positions = pd.Series(np.arange(len(df)), index=df['dataId'].astype(str))
+        self._positions = positions[~positions.index.duplicated(keep='last')]  # The last row of an id wins
+        self._groups = df.groupby('datagroup', sort=False).indices if 'datagroup' in df.columns else {}
+        self._float32 = set(df.select_dtypes('float32').columns)
+        # Read-only views so no session can modify the shared rows
+        self._extra = {str(r['dataId']): MappingProxyType(dict(r)) for r in extra_records}
+        self._cached_row = lru_cache(maxsize=ROW_CACHE_SIZE)(self._build_row)
+
+    def __len__(self):
+        return len(self._positions) + len(self._extra)
+
+    def _build_row(self, position):
+        row = self._frame.iloc[[position]].to_dict('records')[0]
+        for column in self._float32:
+            # float32 scores would otherwise come out as e.g. 0.2199999988 instead of 0.22
+            if row[column] == row[column]:
+                row[column] = round(float(row[column]), 6)
+        return MappingProxyType(row)
+
+    def row(self, data_id):
+        key = str(data_id)
+        if key in self._extra:
+            return self._extra[key]
+        return self._cached_row(int(self._positions[key]))
+
+    def group_ids(self, datagroup):
+        positions = self._groups.get(int(datagroup))
+        if positions is None:
+            return ()
+        return tuple(self._frame['dataId'].iloc[positions].astype(str))
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate memory held by an object graph, counting shared objects once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+class SessionRegistry:
+    """Working state of every annotator session, evicted after `idle_seconds` without a rerun."""
+
+    def __init__(self, idle_seconds=1800, sweep_seconds=60):
+        self.idle_seconds = idle_seconds
+        self.sweep_seconds = sweep_seconds
+        self._lock = threading.Lock()
+        self._states = {}  # session id -> state dict
+        self._last_seen = {}
+        self._last_sweep = time.monotonic()
+
+    def get(self, session_id):
+        """Return the session's state (None if it was never created or has been evicted)."""
+        with self._lock:
+            if session_id in self._states:
+                self._last_seen[session_id] = time.monotonic()
+            return self._states.get(session_id)
+
+    def create(self, session_id, **state):
+        with self._lock:
+            self._states[session_id] = state
+            self._last_seen[session_id] = time.monotonic()
+            return state
+
+    def drop(self, session_id):
+        with self._lock:
+            self._last_seen.pop(session_id, None)
+            return self._states.pop(session_id, None)
+
+    def evict_idle(self):
+        """Drop idle sessions (at most once per `sweep_seconds`); returns the evicted states."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_seconds:
+                return []
+            self._last_sweep = now
+            idle = [sid for sid, seen in self._last_seen.items() if now - seen > self.idle_seconds]
+            evicted = []
+            for sid in idle:
+                del self._last_seen[sid]
+                evicted.append(self._states.pop(sid))
+            return evicted
+
+    def memory_report(self):
+        """Approximate bytes held per session, plus the total."""
+        with self._lock:
+            per_session = {sid: deep_sizeof(state) for sid, state in self._states.items()}
+        return {'sessions': per_session, 'total_bytes': sum(per_session.values())}
@@ -0,0 +1,391 @@
+"""Local-first storage: the app reads and writes SQLite, a worker syncs with Sheets.
+
+`LocalFirstBackend` answers every read from a SQLite mirror of the pulled sheets
+and records every append in an outbox, so no Sheets API call is made while an
+annotator waits (except for the very first read of a sheet that was never
+pulled). `SyncWorker` runs in the background:
+
+- push: outbox rows are appended to the spreadsheet in batches, oldest first;
+- pull: each sheet is downloaded at its own interval and the mirror is only
+  rewritten when the row count or content hash changed.
+
+A failed sync is retried with backoff, and the outbox simply grows meanwhile,
+so the worker catches up on its own after a Sheets outage. A sheet that cannot
+be pushed is skipped for the round (see `blocked` in the status), so it never
+holds up the other sheets.
+
+The columns of every sheet are known before its first row is queued (pulled,
+set with `ensure_sheet()` or read from the spreadsheet), so the worker can
+create a sheet that is missing when it pushes. Rows appended
+locally are visible to reads right away, pushed or not.
+
+Enable it with a `[local_store]` section in the secrets:
+
+    [local_store]
+    path = ".local_store"     # One SQLite file per project
+    push_seconds = 10
+
+Inspect the sync state with `python local_store.py .local_store/default.sqlite3`
+or at /sync on the warm-up's readiness server.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from backend import WorksheetNotFound
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets (
+    name TEXT PRIMARY KEY,
+    header TEXT NOT NULL,
+    row_count INTEGER,
+    content_hash TEXT,
+    pulled_at REAL,
+    changed_at REAL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sheet TEXT NOT NULL,
+    row TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    pushed_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (pushed_at, id);
+"""
+
+
+def mirror_table(sheetname):
+    return f"mirror_{sheetname}"
+
+
+def content_hash(df):
+    """Hash of a sheet's header and cell values, used to skip unchanged pulls."""
+    digest = hashlib.sha256(json.dumps(list(map(str, df.columns))).encode())
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class LocalStore:
+    """SQLite file holding the mirrored sheets, their sync metadata and the outbox."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    # --- Mirror ---
+    def sheet_info(self, sheetname):
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT header, row_count, content_hash, pulled_at, changed_at FROM sheets WHERE name = ?",
+                (sheetname,)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            'header': json.loads(row[0]), 'row_count': row[1], 'content_hash': row[2],
+            'pulled_at': row[3], 'changed_at': row[4],
+        }
+
+    def set_header(self, sheetname, header):
+        """Remember a sheet's columns before it was ever pulled (e.g. a sheet created locally)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sheets (name, header) VALUES (?, ?)", (sheetname, json.dumps(header))
+            )
+
+    def save_sheet(self, sheetname, df):
+        """Store a pulled sheet; returns True if its content changed since the last pull."""
+        digest = content_hash(df)
+        now = time.time()
+        info = self.sheet_info(sheetname)
+        with self._lock, self._conn:
+            if info is not None and info['content_hash'] == digest:
+                self._conn.execute("UPDATE sheets SET pulled_at = ? WHERE name = ?", (now, sheetname))
+                return False
+            # Cells are stored as text or numbers exactly as the sheet returned them
+            if len(df.columns):
+                df.astype(object).to_sql(mirror_table(sheetname), self._conn, if_exists='replace', index=False)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sheets (name, header, row_count, content_hash, pulled_at, changed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (sheetname, json.dumps(list(map(str, df.columns))), len(df), digest, now, now)
+            )
+        return True
+
+    def load_sheet(self, sheetname):
+        """Mirrored rows plus local rows the mirror does not contain yet; None if never pulled."""
+        info = self.sheet_info(sheetname)
+        if info is None:
+            return None
+        header = info['header']
+        with self._lock:
+            if info['pulled_at'] is None or not header:
+                mirrored = pd.DataFrame(columns=header)
+            else:
+                mirrored = pd.read_sql(f'SELECT * FROM "{mirror_table(sheetname)}"', self._conn)
+            # Rows pushed after the last pull are not in the mirror yet either
+            local = self._conn.execute(
+                "SELECT row FROM outbox WHERE sheet = ? AND (pushed_at IS NULL OR pushed_at > ?) ORDER BY id",
+                (sheetname, info['pulled_at'] or 0)
+            ).fetchall()
+        if not local:
+            return mirrored
+        width = len(header)
+        rows = [(values[:width] + [""] * (width - len(values))) for values in (json.loads(r[0]) for r in local)]
+        return pd.concat([mirrored, pd.DataFrame(rows, columns=header)], ignore_index=True)
+
+    # --- Outbox ---
+    def enqueue(self, sheetname, rows):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO outbox (sheet, row, created_at) VALUES (?, ?, ?)",
+                [(sheetname, json.dumps(list(row)), now) for row in rows]
+            )
+
+    def pending(self, limit, skip=()):
+        """Oldest unpushed rows as (sheet, [(id, row), ...]) for the sheet of the oldest one not in `skip`."""
+        skip = list(skip)
+        excluded = f" AND sheet NOT IN ({', '.join('?' * len(skip))})" if skip else ""
+        with self._lock:
+            first = self._conn.execute(
+                f"SELECT sheet FROM outbox WHERE pushed_at IS NULL{excluded} ORDER BY id LIMIT 1", skip
+            ).fetchone()
+            if first is None:
+                return None, []
+            rows = self._conn.execute(
+                "SELECT id, row FROM outbox WHERE pushed_at IS NULL AND sheet = ? ORDER BY id LIMIT ?",
+                (first[0], limit)
+            ).fetchall()
+        return first[0], [(row_id, json.loads(row)) for row_id, row in rows]
+
+    def mark_pushed(self, ids):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE outbox SET pushed_at = ? WHERE id = ?", [(now, i) for i in ids])
+
+    def status(self):
+        """Sync state: pending rows per sheet and the last pull of every mirrored sheet."""
+        with self._lock:
+            pending = dict(self._conn.execute(
+                "SELECT sheet, COUNT(*) FROM outbox WHERE pushed_at IS NULL GROUP BY sheet"
+            ).fetchall())
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM outbox WHERE pushed_at IS NULL").fetchone()[0]
+            sheets = self._conn.execute(
+                "SELECT name, row_count, content_hash, pulled_at, changed_at FROM sheets ORDER BY name"
+            ).fetchall()
+        return {
+            'pending_rows': pending,
+            'oldest_pending_age': round(time.time() - oldest, 1) if oldest else None,
+            'sheets': {
+                name: {'row_count': rows, 'content_hash': (digest or '')[:12], 'pulled_at': pulled, 'changed_at': changed}
+                for name, rows, digest, pulled, changed in sheets
+            },
+        }
+
+
+class LocalFirstBackend:
+    """Backend that serves reads from the local mirror and queues appends for the sync worker.
+
+    Anything it does not implement (offline tools, paging) goes straight to `remote`.
+    """
+
+    def __init__(self, store, remote):
+        self.store = store
+        self.remote = remote
+        self.sync = None
+
+    def __getattr__(self, name):
+        return getattr(self.remote, name)
+
+    def _pulled(self, sheetname):
+        info = self.store.sheet_info(sheetname)
+        return info is not None and info['pulled_at'] is not None
+
+    def read(self, sheetname):
+        if not self._pulled(sheetname):
+            # Never pulled: fetch it once now, later changes come in through the worker
+            try:
+                self.store.save_sheet(sheetname, self.remote.read(sheetname))
+            except WorksheetNotFound:
+                if self.store.sheet_info(sheetname) is None:
+                    raise  # Neither in the spreadsheet nor created locally
+        return self.store.load_sheet(sheetname)
+
+    def read_many(self, sheetnames):
+        cold = [name for name in sheetnames if not self._pulled(name)]
+        if cold:
+            for name, df in zip(cold, self.remote.read_many(cold)):
+                self.store.save_sheet(name, df)
+        return [self.store.load_sheet(name) for name in sheetnames]
+
+    def header(self, sheetname):
+        info = self.store.sheet_info(sheetname)
+        if info is None:
+            return self.remote.header(sheetname)  # Raises WorksheetNotFound if it does not exist there either
+        return info['header']
+
+    def append_rows(self, sheetname, rows):
+        if self.store.sheet_info(sheetname) is None:
+            # Never seen: take its columns from the spreadsheet so the worker can push them
+            self.store.set_header(sheetname, self.header(sheetname))
+        self.store.enqueue(sheetname, rows)
+        if self.sync is not None:
+            self.sync.wake()
+
+    def ensure_sheet(self, sheetname, header):
+        # Created in the spreadsheet by the worker when the first row is pushed
+        self.store.set_header(sheetname, header)
+
+
+class SyncWorker:
+    """Background thread pushing the outbox and pulling changed sheets."""
+
+    def __init__(self, store, remote, pull_seconds, push_seconds=10, batch_size=500, max_backoff=300,
+                 on_change=None):
+        self.store = store
+        self.remote = remote
+        self.pull_seconds = dict(pull_seconds)  # sheet -> seconds between pulls
+        self.push_seconds = push_seconds
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.on_change = on_change  # Called with the sheet name when a pull brings new content
+        self.last_push = None
+        self.last_error = None
+        self.failures = 0
+        self.blocked = {}  # sheet -> error of its last failed push
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sheet-sync", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        """Push soon instead of at the next interval."""
+        self._wake.set()
+
+    def push(self):
+        """Append pending rows in batches; returns the number pushed.
+
+        A sheet whose append fails is skipped for the rest of the round and the
+        other sheets are still pushed; the round only fails if nothing could be.
+        """
+        pushed = 0
+        blocked = {}
+        while True:
+            sheetname, batch = self.store.pending(self.batch_size, skip=blocked)
+            if not batch:
+                break
+            try:
+                self._append(sheetname, [row for _, row in batch])
+            except Exception as e:
+                logger.exception("Pushing %d rows to %s failed", len(batch), sheetname)
+                blocked[sheetname] = str(e)
+                continue
+            self.store.mark_pushed([row_id for row_id, _ in batch])
+            pushed += len(batch)
+        self.blocked = blocked
+        if blocked and not pushed:
+            raise RuntimeError(f"No sheet could be pushed: {blocked}")
+        return pushed
+
+    def _append(self, sheetname, rows):
+        try:
+            self.remote.append_rows(sheetname, rows)
+        except WorksheetNotFound:
+            info = self.store.sheet_info(sheetname)
+            if info is None or not info['header']:
+                raise ValueError(f"Cannot create sheet {sheetname}: its columns are unknown") from None
+            self.remote.ensure_sheet(sheetname, info['header'])
+            self.remote.append_rows(sheetname, rows)
+
+    def pull(self, force=False):
+        """Download the sheets whose interval has passed; returns the names whose content changed."""
+        now = time.time()
+        due = []
+        for sheetname, seconds in self.pull_seconds.items():
+            info = self.store.sheet_info(sheetname)
+            if force or info is None or info['pulled_at'] is None or now - info['pulled_at'] >= seconds:
+                due.append(sheetname)
+        changed = []
+        for sheetname in due:
+            try:
+                df = self.remote.read(sheetname)
+            except WorksheetNotFound:
+                continue
+            if self.store.save_sheet(sheetname, df):
+                changed.append(sheetname)
+                if self.on_change is not None:
+                    self.on_change(sheetname)
+        return changed
+
+    def sync_once(self):
+        self.push()
+        self.pull()
+        self.last_push = time.time()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync_once()
+                self.failures = 0
+                self.last_error = None
+                delay = self.push_seconds
+            except Exception as e:
+                # Keep the outbox and retry with backoff; everything queued meanwhile is pushed on recovery
+                self.failures += 1
+                self.last_error = str(e)
+                delay = min(self.push_seconds * 2 ** self.failures, self.max_backoff)
+                logger.exception("Sheets sync failed, retrying in %ss", delay)
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def status(self):
+        return {
+            **self.store.status(),
+            'last_sync': self.last_push,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'blocked': self.blocked,
+        }
+
+
+def local_first(remote, config, name, pull_seconds):
+    """Wrap `remote` with a local store `<path>/<name>.sqlite3` and start its sync worker."""
+    store = LocalStore(os.path.join(config.get('path', '.local_store'), f"{name}.sqlite3"))
+    backend = LocalFirstBackend(store, remote)
+    backend.sync = SyncWorker(
+        store, remote, pull_seconds,
+        push_seconds=config.get('push_seconds', 10),
+        batch_size=config.get('batch_size', 500),
+    ).start()
+    return backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the sync state of a local store.")
+    parser.add_argument("path", help="SQLite file, e.g. .local_store/default.sqlite3")
+    args = parser.parse_args()
+    print(json.dumps(LocalStore(args.path).status(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
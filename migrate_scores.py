@@ -0,0 +1,60 @@
+"""Rewrite an existing Score sheet into the normalized layout.
+
+Older Score rows copied the reference, sentence, label and metric scores of the
+pair next to each annotation. Those now live only in the Data sheet, so this
+keeps just the id and annotation columns (see `schema.ANNOTATION_COLUMNS`).
+The original rows are copied to a backup worksheet first.
+
+    python migrate_scores.py --dry-run
+    python migrate_scores.py --backup-sheet Score_legacy
+"""
+import argparse
+
+from backend import from_config, load_secrets
+from schema import normalize_scores
+
+
+def cell_count(df):
+    """Cells the frame takes in the sheet, header included."""
+    return (len(df) + 1) * len(df.columns)
+
+
+def text_size(df):
+    """Characters stored in the sheet for the frame, header included."""
+    return sum(len(str(column)) for column in df.columns) + int(df.astype(str).map(len).to_numpy().sum())
+
+
+def sheet_rows(df):
+    return [list(df.columns)] + df.astype(object).where(df.notna(), "").values.tolist()
+
+
+def migrate_scores(backend, sheetname="Score", backup_sheet="Score_legacy", dry_run=False):
+    """Normalize `sheetname` in place; returns (before, after) frames."""
+    scores = backend.read(sheetname)
+    normalized = normalize_scores(scores)
+    if not dry_run and list(normalized.columns) != list(scores.columns):
+        if backup_sheet:
+            backend.write_sheet(backup_sheet, sheet_rows(scores))
+        backend.write_sheet(sheetname, sheet_rows(normalized))
+    return scores, normalized
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drop copied pair data from the Score sheet.")
+    parser.add_argument("--sheet", default="Score", help="Worksheet to normalize")
+    parser.add_argument("--backup-sheet", default="Score_legacy", help="Worksheet for a copy of the original rows ('' for none)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the savings")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    args = parser.parse_args()
+
+    backend = from_config(load_secrets(args.secrets))
+    before, after = migrate_scores(backend, args.sheet, args.backup_sheet, args.dry_run)
+    print(f"{len(before)} rows: {len(before.columns)} -> {len(after.columns)} columns")
+    print(f"Cells: {cell_count(before)} -> {cell_count(after)}")
+    print(f"Characters: {text_size(before)} -> {text_size(after)}")
+    if args.dry_run:
+        print("Dry run, nothing written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Operational metrics of the annotation service in the Prometheus text format.
+
+Counters and histograms are updated where things happen (reruns, Score rows
+queued, Sheets API calls, Submit All errors, sheet cache reads); gauges such as
+active sessions and write queue depth are read when the metrics are rendered.
+Everything is process-wide, like the caches in `resources.py`.
+
+The warm-up server serves them at GET /metrics, and `python warmup.py ...
+--metrics-textfile <path>` also writes them to a file for node_exporter's
+textfile collector (see `warmup.py`).
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_SESSION_SECONDS = 300  # A session counts as active while it reran within this window
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _series(name, labels, values):
+    if not labels:
+        return name
+    pairs = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(labels, values))
+    return f"{name}{{{pairs}}}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{_series(self.name, self.labels, key)} {_number(value)}" for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Observations counted into cumulative `le` buckets, with their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            entry = self._values.setdefault(label_values, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def lines(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f"{_series(self.name + '_bucket', self.labels + ('le',), key + (bound,))} {cumulative}")
+            lines.append(f"{_series(self.name + '_sum', self.labels, key)} {_number(round(total, 6))}")
+            lines.append(f"{_series(self.name + '_count', self.labels, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Values read from `collect()` (returning {label values: value}) whenever metrics are rendered.
+
+    `kind='counter'` exposes totals that another object keeps counting.
+    """
+
+    def __init__(self, name, help, labels=(), collect=None, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        self.kind = kind
+
+    def lines(self):
+        values = self.collect() if self.collect else {}
+        return [f"{_series(self.name, self.labels, key)} {_number(value)}" for key, value in sorted(values.items())]
+
+
+# --- What the app reports ---
+_sessions = {}  # session id -> last rerun (monotonic)
+_sessions_lock = threading.Lock()
+_sessions_pruned = 0.0  # monotonic time of the last prune
+_write_queues = {}  # project -> WriteQueue
+_sheet_caches = {}  # project -> SheetCache
+_syncs = {}  # project -> SyncWorker
+
+
+def _prune_sessions(now):
+    """Forget sessions that have not rerun within the window; the caller holds `_sessions_lock`."""
+    global _sessions_pruned
+    cutoff = now - ACTIVE_SESSION_SECONDS
+    for session_id in [sid for sid, seen in _sessions.items() if seen < cutoff]:
+        del _sessions[session_id]
+    _sessions_pruned = now
+
+
+def record_rerun(page, session_id):
+    RERUNS.inc(page)
+    now = time.monotonic()
+    with _sessions_lock:
+        _sessions[session_id] = now
+        # Prune here too, so ids stay bounded even when nothing scrapes the gauge
+        if now - _sessions_pruned >= ACTIVE_SESSION_SECONDS:
+            _prune_sessions(now)
+
+
+def register_project(project, write_queue=None, sheet_cache=None, sync=None):
+    """Make a project's write queue, sheet cache and sync worker visible to the gauges."""
+    if write_queue is not None:
+        _write_queues[project] = write_queue
+    if sheet_cache is not None:
+        _sheet_caches[project] = sheet_cache
+    if sync is not None:
+        _syncs[project] = sync
+
+
+def _active_sessions():
+    with _sessions_lock:
+        _prune_sessions(time.monotonic())
+        return {(): len(_sessions)}
+
+
+def _cache_reads():
+    return {
+        (project, sheet, result): count
+        for project, cache in list(_sheet_caches.items())
+        for (sheet, result), count in cache.stats().items()
+    }
+
+
+def _outbox_rows():
+    return {
+        (project, sheet): rows
+        for project, sync in list(_syncs.items())
+        for sheet, rows in sync.store.status()['pending_rows'].items()
+    }
+
+
+RERUNS = Counter("annotation_reruns_total", "Script reruns, by page", ('page',))
+SAMPLES_SCORED = Counter(
+    "annotation_samples_scored_total", "Score rows written, by project and sheet", ('project', 'sheet')
+)
+SUBMIT_ERRORS = Counter("annotation_submit_errors_total", "Failed Submit All, by project and task", ('project', 'task'))
+API_LATENCY = Histogram(
+    "sheets_api_request_duration_seconds", "Sheets API call duration (after the quota wait), by project and call",
+    ('project', 'method')
+)
+API_ERRORS = Counter("sheets_api_errors_total", "Sheets API calls that raised, by project and call", ('project', 'method'))
+METRICS = [
+    Gauge("annotation_active_sessions", f"Sessions that reran in the last {ACTIVE_SESSION_SECONDS}s",
+          collect=_active_sessions),
+    RERUNS,
+    SAMPLES_SCORED,
+    SUBMIT_ERRORS,
+    Gauge("annotation_write_queue_depth", "Writes waiting in the project's write queue", ('project',),
+          collect=lambda: {(project,): queue.pending() for project, queue in list(_write_queues.items())}),
+    Gauge("annotation_outbox_pending_rows", "Rows in the local store not yet pushed to Sheets", ('project', 'sheet'),
+          collect=_outbox_rows),
+    API_LATENCY,
+    API_ERRORS,
+    Gauge("sheet_cache_reads_total", "Sheet cache reads by result (hit, stale, miss)",
+          ('project', 'sheet', 'result'), collect=_cache_reads, kind='counter'),
+]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines += metric.lines()
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    # Write-then-rename so the collector never reads a half-written file
+    with open(path + ".tmp", "w") as f:
+        f.write(render())
+    os.replace(path + ".tmp", path)
+
+
+def start_textfile_writer(path, interval=15):
+    """Rewrite `path` every `interval` seconds on a daemon thread."""
+    def run():
+        while True:
+            try:
+                write_textfile(path)
+            except Exception:
+                logger.exception("Writing metrics to %s failed", path)  # Tried again next interval
+            time.sleep(interval)
+    threading.Thread(target=run, name="metrics-textfile", daemon=True).start()
@@ -0,0 +1,96 @@
+"""Rank the target sentences of one reference from pairwise judgments.
+
+Annotators only answer "which of these two targets matches the reference
+better?". `InsertionSort` picks each next question by binary insertion: the
+next candidate is compared with the middle of the range of the ranking it can
+still go in, so ranking N candidates takes at most sum(ceil(log2(i + 1))) for
+i < N judgments (25 for 10 candidates, against 45 for all pairs), within a
+few judgments of the information-theoretic minimum log2(N!).
+
+The scheduler only keeps the ranking so far and the current search range, so a
+session can be rebuilt by replaying its judgments (`replay()`). Every judgment
+is stored as a Score row; `ranking()` recovers an annotator's ranking from them.
+The last `UNDO_WINDOW` judgments of a session are only written at the end, so
+an answer that can still be undone never reaches the sheet.
+"""
+import math
+from graphlib import CycleError, TopologicalSorter
+
+UNDO_WINDOW = 3  # Most recent judgments an annotator can take back
+
+
+def insertion_comparisons(n):
+    """Most judgments binary insertion needs to rank `n` candidates."""
+    return sum(math.ceil(math.log2(i + 1)) for i in range(1, n))
+
+
+class InsertionSort:
+    """Interactive binary insertion sort over `items`, best first."""
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.ranked = self.items[:1]
+        self._next = 1  # Index in `items` of the candidate being inserted
+        self._low, self._high = 0, len(self.ranked)
+
+    def done(self):
+        return self._next >= len(self.items)
+
+    def comparison(self):
+        """(candidate, ranked item to compare it with), or None once everything is ranked."""
+        if self.done():
+            return None
+        return self.items[self._next], self.ranked[(self._low + self._high) // 2]
+
+    def record(self, preferred):
+        """Apply a judgment: `preferred` is whichever of the two compared items won."""
+        candidate, other = self.comparison()
+        middle = (self._low + self._high) // 2
+        if preferred == candidate:
+            self._high = middle
+        elif preferred == other:
+            self._low = middle + 1
+        else:
+            raise ValueError(f"{preferred!r} is not one of the compared items")
+        if self._low == self._high:
+            self.ranked.insert(self._low, candidate)
+            self._next += 1
+            self._low, self._high = 0, len(self.ranked)
+
+    def comparisons_left(self):
+        """Most judgments still needed to finish the ranking."""
+        if self.done():
+            return 0
+        current = math.ceil(math.log2(self._high - self._low + 1))
+        later = sum(math.ceil(math.log2(size + 1)) for size in range(len(self.ranked) + 1, len(self.items)))
+        return current + later
+
+
+def replay(candidate_lists, judgments):
+    """Sorts for `candidate_lists` with `judgments` ((sort index, preferred) pairs) applied in order."""
+    sorts = [InsertionSort(candidates) for candidates in candidate_lists]
+    for index, preferred in judgments:
+        sorts[index].record(preferred)
+    return sorts
+
+
+def ranking(comparisons):
+    """Best-first ranking implied by (winner, loser) judgments of one annotator and reference, in the order made.
+
+    Only the latest judgment of each pair counts. Judgments that still contradict
+    each other (A > B > C > A) fall back to ordering by number of wins.
+    """
+    latest = {}
+    for winner, loser in comparisons:
+        latest[frozenset((winner, loser))] = (winner, loser)
+    graph = {}
+    for winner, loser in latest.values():
+        graph.setdefault(winner, set())
+        graph.setdefault(loser, set()).add(winner)  # The loser comes after the winner
+    try:
+        return list(TopologicalSorter(graph).static_order())
+    except CycleError:
+        wins = {item: 0 for item in graph}
+        for winner, _ in latest.values():
+            wins[winner] += 1
+        return sorted(graph, key=lambda item: -wins[item])
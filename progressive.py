@@ -0,0 +1,66 @@
+"""Progressive commit: write a group's Score rows in small batches while it is annotated.
+
+Instead of one burst write at "Submit All", rows are written once `every`
+completed samples have piled up, so a failed write loses at most one batch and
+the write load is spread over the session. A sample changed again after it was
+written (via "⏮ Previous") is simply written again; readers keep the latest row
+per (datagroup, user_name, dataId), see `schema.latest_scores()`.
+
+Writes are handed to the project's write queue and not waited for until the last
+batch, so advancing to the next sample never waits on the API.
+"""
+from concurrent.futures import wait
+
+
+class ProgressiveCommit:
+    """Tracks which rows of a session were written and writes the changed ones in batches."""
+
+    def __init__(self, every=None):
+        self.every = every  # None: write everything at the final submit only
+        self.committed = {}  # sample index -> row as last written
+        self._inflight = []  # (future, rows they replaced in `committed`)
+
+    def _collect_failures(self):
+        """Forget rows whose write failed so they are written again with the next batch."""
+        still_running = []
+        for future, previous in self._inflight:
+            if not future.done():
+                still_running.append((future, previous))
+            elif future.exception() is not None:
+                for sample_idx, row in previous.items():
+                    if row is None:
+                        self.committed.pop(sample_idx, None)
+                    else:
+                        self.committed[sample_idx] = row
+        self._inflight = still_running
+
+    def changed(self, rows):
+        """Rows (sample index -> row) not yet written in their current form."""
+        self._collect_failures()
+        return {sample_idx: row for sample_idx, row in rows.items() if self.committed.get(sample_idx) != row}
+
+    def flush(self, rows, write, final=False):
+        """Write the changed rows once a batch is full (or all of them if `final`).
+
+        `write(list_of_rows)` must return a Future. Returns the Future, or None if
+        nothing was written.
+        """
+        changed = self.changed(rows)
+        if not changed or (not final and (not self.every or len(changed) < self.every)):
+            return None
+        future = write(list(changed.values()))
+        self._inflight.append((future, {sample_idx: self.committed.get(sample_idx) for sample_idx in changed}))
+        self.committed.update(changed)  # Counted as written now so the next batch does not repeat them
+        return future
+
+    def finish(self, rows, write, timeout=120):
+        """Write every remaining row and wait until all batches have landed; raises the first write error."""
+        self.flush(rows, write, final=True)
+        futures = [future for future, _ in self._inflight]
+        wait(futures, timeout)
+        errors = [future.exception() for future in futures if future.done() and future.exception() is not None]
+        self._collect_failures()
+        if errors:
+            raise errors[0]
+        if self._inflight:
+            raise TimeoutError("Some evaluations are still being saved, please submit again")
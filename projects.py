@@ -0,0 +1,195 @@
+"""Several evaluation projects served by one deployment.
+
+Each project has its own spreadsheet (or local directory), its own caches, a
+single-threaded write queue and a share of the Sheets API quota, so a busy
+project cannot starve the others. Projects are listed in the secrets; the rest
+of the secrets (service account, [cache_ttl], ...) is shared and can be
+overridden per project:
+
+    default_project = "semantic"
+
+    [quota]
+    requests_per_minute = 240   # For the whole deployment; Sheets allows 300 per minute
+
+    [projects.semantic]
+    spreadsheet = "https://docs.google.com/spreadsheets/d/..."
+    quota_share = 2
+
+    [projects.radiology]
+    spreadsheet = "https://docs.google.com/spreadsheets/d/..."
+
+    [projects.radiology.tasks.score_and_rank]
+    score_sheet = "Score"
+
+Pages pick the project from the `?project=` URL parameter. Without a
+[projects] section the deployment is a single project named "default" that
+uses the secrets as they are.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from monitoring import API_ERRORS, API_LATENCY
+
+DEFAULT_PROJECT = "default"
+DEFAULT_REQUESTS_PER_MINUTE = 240
+# Sections a project may override; everything else comes from the shared secrets
+PROJECT_SECTIONS = ['backend', 'tasks', 'score_shards', 'cache_ttl', 'dedup']
+
+
+class QuotaExceeded(RuntimeError):
+    """A project used up its share of the API quota and the wait timed out."""
+
+
+class ProjectBusy(RuntimeError):
+    """A project's write queue is full."""
+
+
+def project_names(secrets):
+    return list(secrets.get("projects", {})) or [DEFAULT_PROJECT]
+
+
+def default_project(secrets):
+    return secrets.get("default_project") or project_names(secrets)[0]
+
+
+def project_secrets(secrets, project):
+    """Secrets as seen by one project: the shared ones with the project's overrides applied."""
+    projects = secrets.get("projects", {})
+    if not projects:
+        return secrets
+    config = projects[project]
+    merged = {key: value for key, value in secrets.items() if key not in ('projects', 'default_project')}
+    if 'spreadsheet' in config:
+        merged['connections'] = {'gsheets': {'spreadsheet': config['spreadsheet']}}
+    for section in PROJECT_SECTIONS:
+        if section in config:
+            merged[section] = config[section]
+    return merged
+
+
+def quota_rate(secrets, project):
+    """Requests per minute for `project`: the deployment quota split by `quota_share`."""
+    total = secrets.get("quota", {}).get("requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE)
+    projects = secrets.get("projects", {})
+    if not projects:
+        return total
+    shares = {name: config.get('quota_share', 1) for name, config in projects.items()}
+    return total * shares[project] / sum(shares.values())
+
+
+class TokenBucket:
+    """Allows `rate_per_minute` calls on average, with bursts of up to `burst` calls."""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60
+        self.capacity = burst or max(1.0, rate_per_minute / 6)  # Ten seconds' worth
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=60):
+        """Take one token, waiting for it at most `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                raise QuotaExceeded(f"API quota exhausted, no request slot within {timeout}s")
+            time.sleep(wait)
+
+
+class QuotaBackend:
+    """Backend wrapper that takes a token from the project's bucket before each API call.
+
+    Also times every call for the latency histogram in `monitoring.py`.
+    """
+
+    def __init__(self, backend, bucket, project=DEFAULT_PROJECT):
+        self.backend = backend
+        self.bucket = bucket
+        self.project = project
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def _timed(self, name, call):
+        started = time.perf_counter()
+        try:
+            return call()
+        except Exception:
+            API_ERRORS.inc(self.project, name)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, self.project, name)
+
+    def _call(self, name, *args):
+        self.bucket.acquire()
+        return self._timed(name, lambda: getattr(self.backend, name)(*args))
+
+    def read(self, sheetname):
+        return self._call('read', sheetname)
+
+    def read_many(self, sheetnames):
+        return self._call('read_many', sheetnames)
+
+    def header(self, sheetname):
+        return self._call('header', sheetname)
+
+    def append_rows(self, sheetname, rows):
+        return self._call('append_rows', sheetname, rows)
+
+    def write_sheet(self, sheetname, rows):
+        return self._call('write_sheet', sheetname, rows)
+
+    def ensure_sheet(self, sheetname, header):
+        return self._call('ensure_sheet', sheetname, header)
+
+    def iter_pages(self, sheetname, start_row=2, page_size=5000, width=None):
+        pages = self.backend.iter_pages(sheetname, start_row, page_size, width)
+        while True:
+            self.bucket.acquire()
+            page = self._timed('iter_pages', lambda: next(pages, None))
+            if page is None:
+                return
+            yield page
+
+    def sibling(self, spreadsheet_url):
+        # Shards in other spreadsheets count against the same project quota
+        return QuotaBackend(self.backend.sibling(spreadsheet_url), self.bucket, self.project)
+
+
+class WriteQueue:
+    """Runs one project's writes in order on its own thread, with a bounded backlog."""
+
+    def __init__(self, maxsize=100, name="writes"):
+        self._queue = queue.Queue(maxsize)
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def submit(self, fn, *args):
+        """Queue `fn(*args)`; returns a Future. Raises ProjectBusy when the backlog is full."""
+        future = Future()
+        try:
+            self._queue.put_nowait((future, fn, args))
+        except queue.Full:
+            raise ProjectBusy("Too many pending writes, please try again in a moment") from None
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            future, fn, args = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
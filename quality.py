@@ -0,0 +1,143 @@
+"""Annotator quality control: gold items, dwell time and a streaming anomaly detector.
+
+Gold items are pairs with a known score that get mixed into every group. While an
+annotator works through a group, `SessionMonitor` keeps running counts of how fast
+they answer, how often they give the same score and how they do on gold items.
+Scores from flagged sessions are recorded in the "Flagged" sheet and dropped from
+aggregates with `exclude_flagged()`.
+"""
+import random
+from collections import Counter
+
+import pandas as pd
+
+GOLD_PREFIX = "gold-"
+
+GOLD_ITEMS = [
+    {
+        'reference': "The watermelon seeds pass through your digestive system.",
+        'sentence': "The watermelon seeds will be excreted.",
+        'score': 5,
+    },
+    {
+        'reference': "The watermelon seeds pass through your digestive system.",
+        'sentence': "You grow watermelons in your stomach.",
+        'score': 1,
+    },
+    {
+        'reference': "Regular exercise lowers the risk of heart disease.",
+        'sentence': "Exercising regularly reduces your chances of developing heart disease.",
+        'score': 5,
+    },
+    {
+        'reference': "Regular exercise lowers the risk of heart disease.",
+        'sentence': "Regular exercise raises the risk of heart disease.",
+        'score': 1,
+    },
+]
+
+
+def is_gold(data_id):
+    return str(data_id).startswith(GOLD_PREFIX)
+
+
+def gold_score(data_id):
+    """Known score of a gold item, or None for regular pairs."""
+    if not is_gold(data_id):
+        return None
+    return GOLD_ITEMS[int(str(data_id)[len(GOLD_PREFIX):])]['score']
+
+
+def gold_records():
+    """Gold items as Data-sheet style rows."""
+    return [
+        {
+            'dataId': f"{GOLD_PREFIX}{i}",
+            'datagroup': None,
+            'reference': item['reference'],
+            'sentence': item['sentence'],
+            'label': "gold",
+        }
+        for i, item in enumerate(GOLD_ITEMS)
+    ]
+
+
+def seed_gold_items(data_ids, count=1, rng=random):
+    """Insert `count` random gold item ids at random positions of a group's id list."""
+    data_ids = list(data_ids)
+    if not data_ids or count <= 0:
+        return data_ids
+    for i in rng.sample(range(len(GOLD_ITEMS)), min(count, len(GOLD_ITEMS))):
+        data_ids.insert(rng.randint(0, len(data_ids)), f"{GOLD_PREFIX}{i}")
+    return data_ids
+
+
+class SessionMonitor:
+    """Running quality checks for one annotator session.
+
+    Samples can be revisited with "Previous", so observations are keyed by sample
+    index and the counters are adjusted when an earlier answer is replaced.
+    """
+
+    def __init__(self, min_samples=5, fast_seconds=3.0, fast_fraction=0.5,
+                 constant_fraction=0.9, gold_tolerance=1):
+        self.min_samples = min_samples
+        self.fast_seconds = fast_seconds
+        self.fast_fraction = fast_fraction
+        self.constant_fraction = constant_fraction
+        self.gold_tolerance = gold_tolerance
+
+        self._seen = {}  # sample index -> (score, is_fast, gold_failed)
+        self._scores = Counter()
+        self._fast = 0
+        self._gold_failed = 0
+
+    def _apply(self, observation, sign):
+        score, is_fast, gold_failed = observation
+        self._scores[score] += sign
+        self._fast += sign * is_fast
+        self._gold_failed += sign * gold_failed
+
+    def observe(self, sample_idx, score, dwell_seconds, data_id):
+        expected = gold_score(data_id)
+        observation = (
+            score,
+            dwell_seconds < self.fast_seconds,
+            expected is not None and abs(score - expected) > self.gold_tolerance,
+        )
+        if sample_idx in self._seen:
+            self._apply(self._seen[sample_idx], -1)
+        self._seen[sample_idx] = observation
+        self._apply(observation, 1)
+
+    @property
+    def flags(self):
+        """Reasons this session looks unreliable; empty when it looks fine."""
+        reasons = []
+        if self._gold_failed:
+            reasons.append("failed gold item")
+        n = len(self._seen)
+        if n >= self.min_samples:
+            if self._fast / n >= self.fast_fraction:
+                reasons.append("too fast")
+            if max(self._scores.values()) / n >= self.constant_fraction:
+                reasons.append("constant answers")
+        return reasons
+
+
+FLAGGED_COLUMNS = ['user_name', 'dataId', 'reason']
+
+
+def flagged_rows(user_name, data_ids, reasons):
+    """Rows for the "Flagged" sheet: one per scored pair of a flagged session."""
+    reason = ", ".join(reasons)
+    return [[user_name, str(data_id), reason] for data_id in data_ids if not is_gold(data_id)]
+
+
+def exclude_flagged(scores, flagged):
+    """Drop Score rows that belong to flagged sessions."""
+    if flagged is None or len(flagged) == 0 or not {'user_name', 'dataId'}.issubset(flagged.columns):
+        return scores
+    keys = pd.MultiIndex.from_arrays([flagged['user_name'].astype(str), flagged['dataId'].astype(str)])
+    rows = pd.MultiIndex.from_arrays([scores['user_name'].astype(str), scores['dataId'].astype(str)])
+    return scores[~rows.isin(keys)]
@@ -0,0 +1,231 @@
+"""Process-wide cached resources shared by the app script and the warm-up.
+
+Keeping these in a module (rather than in the script Streamlit re-executes) means
+the warm-up in `warmup.py` and every session hit the same `st.cache_resource`
+entries. Everything except the session registry is kept per project (see
+`projects.py`); pages get their project from `current_project()`.
+"""
+import functools
+import logging
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from backend import WorksheetNotFound, from_config
+from dedup import data_chunks, find_duplicates
+from group_store import GroupStore, SessionRegistry
+from local_store import local_first
+from monitoring import SAMPLES_SCORED, record_rerun, register_project
+from projects import (
+    QuotaBackend, TokenBucket, WriteQueue, default_project, project_names, project_secrets, quota_rate
+)
+from quality import FLAGGED_COLUMNS, exclude_flagged, gold_records
+from sampler import ActiveSampler
+from schema import compact_data, latest_scores, validate_data
+from search_index import SearchIndex
+from sharding import shard_scores
+from sheet_cache import SheetCache
+from tasks import configured_tasks, score_sheets
+
+# Seconds before a cached sheet is refreshed in the background; override with [cache_ttl] in secrets
+SHEET_TTLS = {
+    "Data": 3600,  # Rarely changes
+    "Finished": 60,  # Changes with every submitted group
+    "Score": 600,
+    "Flagged": 600,
+}
+
+logger = logging.getLogger(__name__)
+
+MAX_PROJECTS = 32  # Bound on the per-project cache entries kept in one process
+WRITE_QUEUE_SIZE = 100
+WRITE_TIMEOUT = 120
+
+
+def current_project():
+    """Project of this session: the ?project= URL parameter, else the configured default."""
+    requested = st.query_params.get("project")
+    if requested:
+        st.session_state.project = requested
+    project = st.session_state.get("project") or default_project(st.secrets)
+    if project not in project_names(st.secrets):
+        st.error(f"Unknown project: {project}")
+        st.stop()
+    return project
+
+def track_rerun(page):
+    """Count this rerun of `page` and mark the session active for the metrics in `monitoring.py`."""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    record_rerun(page, st.session_state.session_id)
+
+def get_project_secrets(project):
+    return project_secrets(st.secrets, project)
+
+
+@st.cache_resource(max_entries=MAX_PROJECTS)
+def get_tasks(project):
+    """Task definitions with the project's [tasks] overrides applied."""
+    return configured_tasks(get_project_secrets(project).get("tasks", {}))
+
+# --- SETUP GOOGLE SHEETS CONNECTION ---
+@st.cache_resource(max_entries=MAX_PROJECTS)  # One authenticated client and opened spreadsheet per project
+def get_backend(project):
+    """Return the project's backend (Google Sheets unless [backend] type = "local").
+
+    Calls are rate limited to the project's share of the API quota. Every task's
+    Score sheet is sharded as set in [score_shards]; reads see one table.
+    """
+    secrets = get_project_secrets(project)
+    backend = QuotaBackend(from_config(secrets), TokenBucket(quota_rate(st.secrets, project)), project)
+    backend = shard_scores(backend, secrets.get("score_shards", {}), score_sheets(get_tasks(project)))
+    if "local_store" in secrets:
+        # Sessions only touch SQLite; a worker pushes appends and pulls each sheet once per TTL
+        backend = local_first(backend, secrets["local_store"], project, sheet_ttls(project))
+    return backend
+
+@st.cache_resource(max_entries=MAX_PROJECTS)
+def get_write_queue(project):
+    """The project's writes, applied one at a time so a burst of submits queues up instead of piling on the API."""
+    queue = WriteQueue(WRITE_QUEUE_SIZE, name=f"writes-{project}")
+    register_project(project, write_queue=queue)
+    return queue
+
+def append_rows_async(project, sheetname, rows):
+    """Queue rows for the project's write queue; returns a Future."""
+    future = get_write_queue(project).submit(get_backend(project).append_rows, sheetname, rows)
+    if sheetname in score_sheets(get_tasks(project)):
+        # Count score rows once they are written, not when they are queued
+        def count_written(f):
+            if not f.cancelled() and f.exception() is None:
+                SAMPLES_SCORED.inc(project, sheetname, amount=len(rows))
+        future.add_done_callback(count_written)
+    return future
+
+def append_rows(project, sheetname, rows):
+    """Append rows through the project's write queue and wait until they are written."""
+    return append_rows_async(project, sheetname, rows).result(WRITE_TIMEOUT)
+
+def prepare_sheet(sheetname, df):
+    if sheetname == "Data":
+        # Bad rows never reach an annotator; the report stays on the frame for admins
+        df, quarantined = validate_data(df)
+        if len(quarantined):
+            logger.warning(
+                "Quarantined %d Data rows in %d datagroups: %s", len(quarantined),
+                quarantined['datagroup'].nunique(), quarantined['reason'].value_counts().to_dict()
+            )
+        df = compact_data(df)  # Categorical/float32/int32/Arrow columns instead of object
+        df.attrs['quarantined'] = quarantined
+    return df
+
+def fetch_sheet(backend, sheetname):
+    """Download one worksheet; also runs on the cache's background refresh threads."""
+    return prepare_sheet(sheetname, backend.read(sheetname))
+
+def fetch_sheets(backend, sheetnames):
+    """Download several worksheets in a single batchGet request."""
+    return [prepare_sheet(name, df) for name, df in zip(sheetnames, backend.read_many(sheetnames))]
+
+def sheet_ttls(project):
+    """Seconds between refreshes of every sheet the project's tasks read."""
+    tasks = get_tasks(project).values()
+    # Every task's sheets change as often as the original ones
+    finished = {task['finished_sheet']: SHEET_TTLS["Finished"] for task in tasks if task['finished_sheet']}
+    scores = {task['score_sheet']: SHEET_TTLS["Score"] for task in tasks}
+    return {**finished, **scores, **SHEET_TTLS, **get_project_secrets(project).get("cache_ttl", {})}
+
+@st.cache_resource(max_entries=MAX_PROJECTS)
+def get_sheet_cache(project):
+    """The project's sheet cache: one refresh in flight per sheet, stale copy served meanwhile."""
+    backend = get_backend(project)
+    cache = SheetCache(
+        functools.partial(fetch_sheet, backend),
+        batch_loader=functools.partial(fetch_sheets, backend),
+        ttls=sheet_ttls(project)
+    )
+    sync = getattr(backend, "sync", None)
+    if sync is not None:
+        sync.on_change = cache.invalidate  # Pulled changes show up on the next read
+    register_project(project, sheet_cache=cache, sync=sync)
+    return cache
+
+def load_data(project, sheetname):
+    """Load data from Google Sheets with caching. The frame is shared, do not modify it."""
+    return get_sheet_cache(project).get(sheetname)
+
+def load_sheets(project, *sheetnames):
+    """Load several sheets at once; cold sheets are fetched in one request."""
+    return get_sheet_cache(project).get_many(sheetnames)
+
+def load_flagged(project):
+    """Flagged sessions from quality control; empty if the sheet does not exist yet."""
+    try:
+        return load_data(project, "Flagged")
+    except WorksheetNotFound:
+        return pd.DataFrame(columns=FLAGGED_COLUMNS)
+
+def load_finished(project, sheetname):
+    """Finished groups of a task; empty if the task has no Finished sheet (yet)."""
+    if sheetname:
+        try:
+            return load_data(project, sheetname)
+        except WorksheetNotFound:
+            pass
+    return pd.DataFrame(columns=['datagroup', 'user_name'])
+
+@st.cache_resource(ttl=1200, max_entries=MAX_PROJECTS)  # Rebuilt with the Data cache every 20 minutes
+def get_duplicates(project):
+    """Near-duplicate clusters of the project's pairs, or None unless [dedup] is configured."""
+    config = get_project_secrets(project).get("dedup")
+    if config is None:
+        return None
+    index = find_duplicates(data_chunks(load_data(project, "Data")), config)
+    logger.info("Project %s: near-duplicate pairs %s", project, index.report())
+    return index
+
+@st.cache_resource(max_entries=MAX_PROJECTS)
+def get_sampler_leases(project):
+    """Pairs the sampler handed out (dataId -> lease expiry); outlives the sampler's rebuilds."""
+    return {}
+
+@st.cache_resource(ttl=1200, max_entries=MAX_PROJECTS)  # Rebuilt from the Score sheet every 20 minutes
+def get_sampler(project):
+    """The project's active sampler, shared by all its sessions; submissions are recorded as they come."""
+    duplicates = get_duplicates(project)
+    return ActiveSampler(
+        load_data(project, "Data"),
+        latest_scores(exclude_flagged(
+            load_data(project, get_tasks(project)['semantic_match']['score_sheet']), load_flagged(project)
+        )),
+        representatives=duplicates.representative if duplicates else None,
+        leases=get_sampler_leases(project),
+    )
+
+@st.cache_resource(ttl=1200, max_entries=MAX_PROJECTS)  # Rebuilt with the Data cache every 20 minutes
+def get_group_store(project):
+    """The project's read-only Data rows, shared by all its sessions."""
+    return GroupStore(load_data(project, "Data"), gold_records())
+
+def search_loaders(project):
+    """Table name -> loader for the sheets the admin search covers (missing Score sheets are empty)."""
+    def load(sheetname):
+        try:
+            return load_data(project, sheetname)
+        except WorksheetNotFound:
+            return pd.DataFrame()
+    names = ["Data"] + list(score_sheets(get_tasks(project)))
+    return {name: functools.partial(load, name) for name in names}
+
+@st.cache_resource(max_entries=MAX_PROJECTS)  # Edited rows make the index rebuild itself (see search_index.py)
+def get_search_index(project):
+    """The project's search index; filled in the background by `SearchIndex.update_in_background()`."""
+    index = SearchIndex()
+    index.update_in_background(search_loaders(project))
+    return index
+
+@st.cache_resource
+def get_session_registry():
+    """Working state of all sessions, kept in one place so idle sessions can be evicted."""
+    return SessionRegistry()
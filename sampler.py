@@ -0,0 +1,171 @@
+"""Active sampling: hand out the (reference, sentence) pairs that are most informative to annotate next.
+
+A pair is informative when the metrics disagree about it (their percentile ranks
+are spread apart) and when we are still uncertain about its human score. Pairs are
+kept in a priority heap and handed out in groups; a handed-out pair is leased to
+that annotator until they submit or the lease expires.
+
+Pairs whose human score is already confident are retired: they are no longer
+handed out, so annotator time goes to the pairs raters still disagree on.
+
+Near-duplicate pairs (see `dedup.py`) are never handed out themselves: their
+representative is, and its scores stand for the whole cluster.
+"""
+import heapq
+import math
+import threading
+import time
+
+import pandas as pd
+
+SCORE_COLUMNS = ['s1', 's2', 's3']
+
+# Keeps pairs where all metrics agree in the queue; they still need a few human labels
+DISAGREEMENT_FLOOR = 0.5
+
+
+def metric_disagreement(df, columns=SCORE_COLUMNS):
+    """Spread of the metrics' percentile ranks per pair (0 = all metrics agree)."""
+    ranks = df[columns].apply(pd.to_numeric, errors='coerce').rank(pct=True)
+    return ranks.std(axis=1, ddof=0).fillna(0.0)
+
+
+class ItemPosterior:
+    """Per-pair posterior over the mean human score, used to decide when a pair is settled.
+
+    A pair is retired once it has `min_ratings` ratings and the posterior standard
+    deviation of its mean falls below `target_sd` (two raters agreeing on a 5 is
+    enough), or once it reaches `max_ratings` however contested it is.
+    """
+
+    def __init__(self, prior_var=2.0, prior_strength=1.0, min_ratings=2, max_ratings=5, target_sd=0.5):
+        self.prior_var = prior_var
+        self.prior_strength = prior_strength
+        self.min_ratings = min_ratings
+        self.max_ratings = max_ratings
+        self.target_sd = target_sd
+        self._stats = {}  # key -> [n, mean, sum of squared deviations]
+
+    def add(self, key, score):
+        stats = self._stats.setdefault(key, [0, 0.0, 0.0])
+        stats[0] += 1
+        delta = score - stats[1]
+        stats[1] += delta / stats[0]
+        stats[2] += delta * (score - stats[1])
+
+    def count(self, key):
+        return self._stats.get(key, (0,))[0]
+
+    def mean(self, key):
+        stats = self._stats.get(key)
+        return stats[1] if stats else None
+
+    def uncertainty(self, key):
+        """Posterior standard deviation of the mean human score for a pair."""
+        n, _, m2 = self._stats.get(key, (0, 0.0, 0.0))
+        var = (m2 + self.prior_strength * self.prior_var) / (n + self.prior_strength)
+        return math.sqrt(var / (n + 1))
+
+    def is_confident(self, key):
+        n = self.count(key)
+        if n >= self.max_ratings:
+            return True
+        return n >= self.min_ratings and self.uncertainty(key) <= self.target_sd
+
+    def summary(self):
+        """Retired pair count and ratings spent per retired pair."""
+        retired = [key for key in self._stats if self.is_confident(key)]
+        spent = sum(self._stats[key][0] for key in retired)
+        return {
+            'rated_pairs': len(self._stats),
+            'retired_pairs': len(retired),
+            'ratings_per_retired_pair': spent / len(retired) if retired else 0.0,
+        }
+
+
+class ActiveSampler:
+    """Process-wide priority queue of pairs, shared by all annotator sessions."""
+
+    def __init__(self, df, scores=None, posterior=None, lease_seconds=3600, representatives=None, leases=None):
+        self.posterior = posterior or ItemPosterior()
+        self.lease_seconds = lease_seconds
+        self._representative = dict(representatives or {})  # duplicate dataId -> representative dataId
+
+        self._lock = threading.Lock()
+        self._keys = df['dataId'].astype(str).tolist()
+        self._row = {key: i for i, key in enumerate(self._keys)}
+        self._disagreement = metric_disagreement(df).tolist()
+        self._version = dict.fromkeys(self._keys, 0)
+        # key -> lease expiry; pass the previous sampler's dict so a rebuild keeps the pairs handed out
+        self._leases = {} if leases is None else leases
+        self._heap = []
+
+        if scores is not None and {'dataId', 'human_score'}.issubset(scores.columns):
+            human = pd.to_numeric(scores['human_score'], errors='coerce')
+            for key, score in zip(scores['dataId'].astype(str), human):
+                key = self._representative.get(key, key)
+                if key in self._row and not math.isnan(score):
+                    self.posterior.add(key, score)
+
+        for key in self._keys:
+            if key not in self._representative:
+                self._push(key)
+
+    # ----- scoring -----
+
+    def priority(self, key):
+        return (DISAGREEMENT_FLOOR + self._disagreement[self._row[key]]) * self.posterior.uncertainty(key)
+
+    def _push(self, key):
+        self._version[key] += 1
+        if not self.posterior.is_confident(key):
+            heapq.heappush(self._heap, (-self.priority(key), self._version[key], key))
+
+    def _reclaim_expired(self, now):
+        for key, expiry in list(self._leases.items()):
+            if expiry <= now:
+                del self._leases[key]
+                self._push(key)
+
+    # ----- public API -----
+
+    def next_group(self, size):
+        """Lease the `size` highest-priority pairs and return their dataIds."""
+        with self._lock:
+            now = time.monotonic()
+            self._reclaim_expired(now)
+            picked = []
+            while self._heap and len(picked) < size:
+                _, version, key = heapq.heappop(self._heap)
+                if version != self._version[key] or key in self._leases:
+                    continue  # stale heap entry
+                self._leases[key] = now + self.lease_seconds
+                picked.append(key)
+        return picked
+
+    def record(self, key, human_score):
+        """Fold a submitted human score into the estimate and requeue the pair."""
+        key = self._representative.get(str(key), str(key))
+        with self._lock:
+            if key not in self._row:
+                return
+            self.posterior.add(key, float(human_score))
+            self._leases.pop(key, None)
+            self._push(key)
+
+    def release(self, keys):
+        """Return leased pairs to the queue without a score (e.g. an abandoned group)."""
+        with self._lock:
+            for key in map(str, keys):
+                if self._leases.pop(key, None) is not None:
+                    self._push(key)
+
+    def summary(self):
+        """Retirement progress (see `ItemPosterior.summary()`) plus queue and lease counts."""
+        with self._lock:
+            return {**self.posterior.summary(), 'pairs': len(self._keys), 'leased_pairs': len(self._leases)}
+
+    def is_retired(self, keys):
+        """Boolean per key: True when the pair's human score is already confident."""
+        with self._lock:
+            return [self.posterior.is_confident(self._representative.get(str(key), str(key))) for key in keys]
@@ -0,0 +1,122 @@
+"""Column layouts and types for the Data and Score sheets.
+
+`get_all_records()` gives object columns for everything. `validate_data()` checks
+the Data sheet in bulk and sets aside rows that would break a session (no
+datagroup, empty text, a score that is not a number, ...) together with the rest
+of their group, so annotators only ever get complete, well-typed groups.
+`compact_data()` then turns the Data sheet into a compact typed frame: the metric names and labels repeat a handful
+of values on every row, so they become categoricals; scores are float32, the
+datagroup int32, and the long reference/sentence texts Arrow-backed strings.
+
+Score rows only hold ids and the annotation itself; the pair text and metric
+scores stay in the Data sheet and are joined back with `score_view()`.
+"""
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+REQUIRED_COLUMNS = ['datagroup', 'dataId', 'reference', 'sentence']
+CATEGORY_COLUMNS = ['m1', 'm2', 'm3', 'label']
+SCORE_COLUMNS = ['s1', 's2', 's3']
+TEXT_COLUMNS = ['dataId', 'reference', 'sentence']
+
+# Score sheet layouts: the semantic match task, and the v2 task that also ranks the metrics
+SCORE_SHEET_COLUMNS = ['datagroup', 'user_name', 'dataId', 'human_score']
+RANKED_SCORE_SHEET_COLUMNS = ['datagroup', 'user_name', 'dataId', 'A_rank', 'B_rank', 'C_rank', 'human_score']
+# Pairwise task: one row per judgment of `dataId` against `other_dataId`, `preferred` is the winner
+PAIRWISE_SCORE_SHEET_COLUMNS = ['datagroup', 'user_name', 'dataId', 'other_dataId', 'preferred']
+ANNOTATION_COLUMNS = RANKED_SCORE_SHEET_COLUMNS + ['other_dataId', 'preferred']
+# Never in the sheet; set on Score rows copied onto near-duplicate pairs (see `dedup.propagate_scores()`)
+PROPAGATED_COLUMNS = ['duplicate_of']
+
+
+class DataValidationError(ValueError):
+    """The Data sheet cannot be used at all (e.g. a required column is missing)."""
+
+
+class ScoreLayoutError(ValueError):
+    """A Score sheet's header is not the layout its rows are written in (see `migrate_scores.py`)."""
+
+
+def validate_data(df, quarantine='group'):
+    """Check and coerce the Data sheet; returns (valid rows, quarantined rows with a `reason`).
+
+    With `quarantine='group'` a bad row takes the rest of its datagroup with it;
+    with `'row'` only the bad rows are set aside.
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise DataValidationError(f"Data sheet is missing columns: {', '.join(missing)}")
+
+    df = df.copy()
+    reasons = pd.Series('', index=df.index)
+
+    def flag(mask, reason):
+        nonlocal reasons
+        reasons = reasons.mask(mask & (reasons == ''), reason)  # Keep the first reason per row
+
+    datagroup = pd.to_numeric(df['datagroup'], errors='coerce')
+    flag(datagroup.isna() | (datagroup % 1 != 0), "datagroup is not an integer")
+    for column in TEXT_COLUMNS:
+        if column in df.columns:
+            flag(df[column].isna() | (df[column].astype(str).str.strip() == ''), f"{column} is empty")
+    flag(df['dataId'].astype(str).duplicated(keep='first'), "duplicate dataId")
+    for column in SCORE_COLUMNS:
+        if column in df.columns:
+            scores = pd.to_numeric(df[column], errors='coerce')
+            flag(scores.isna(), f"{column} is not a number")
+            df[column] = scores
+    df['datagroup'] = datagroup
+
+    bad = reasons != ''
+    if quarantine == 'group':
+        with_bad_row = datagroup.isin(datagroup[bad].dropna().unique()) & ~bad
+        reasons[with_bad_row] = "another row of the datagroup is invalid"
+        bad |= with_bad_row
+    return df.loc[~bad], df.loc[bad].assign(reason=reasons[bad])
+
+
+def compact_data(df):
+    """Return a typed, compact copy of the Data sheet."""
+    df = df.copy()
+    if 'datagroup' in df.columns:
+        df['datagroup'] = pd.to_numeric(df['datagroup']).astype('int32')
+    for column in SCORE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float32')
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(str).astype('category')
+    for column in TEXT_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(str).astype(STRING_DTYPE)
+    return df
+
+
+def normalize_scores(scores):
+    """Keep only the id and annotation columns of Score rows (drops copied pair data)."""
+    return scores[[column for column in ANNOTATION_COLUMNS + PROPAGATED_COLUMNS if column in scores.columns]]
+
+
+def latest_scores(scores):
+    """Last Score row per (datagroup, user_name, dataId): later rows are edits of earlier ones.
+
+    Pairwise judgments are keyed by both compared pairs.
+    """
+    key = [column for column in ['datagroup', 'user_name', 'dataId', 'other_dataId'] if column in scores.columns]
+    if not key or scores.empty:
+        return scores
+    return scores.loc[~scores[key].astype(str).duplicated(keep='last')]
+
+
+def score_view(scores, data):
+    """Score rows joined with their pair text, label and metric scores from the Data sheet."""
+    annotations = normalize_scores(latest_scores(scores))
+    annotations = annotations.assign(dataId=annotations['dataId'].astype(str))
+    pairs = data.drop(columns=['datagroup'], errors='ignore')
+    pairs = pairs.assign(dataId=pairs['dataId'].astype(str))
+    return annotations.merge(pairs, on='dataId', how='left')
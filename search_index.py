@@ -0,0 +1,200 @@
+"""In-memory search over the Data and Score sheets for the admin page.
+
+Each table gets an inverted index from lowercase word to the row numbers that
+contain it (over `reference`/`sentence`), plus exact-value indexes on dataId,
+datagroup, user_name and label. Row numbers are kept as packed uint32 arrays,
+so a million-row table costs a few bytes per word occurrence, and a query is an
+intersection of sorted arrays.
+
+Tables are indexed in chunks and only rows past the ones already indexed are
+added on the next `extend()`, so a sheet that grows (Score) is never indexed
+twice and searches already work while the first build is running. Postings are
+row positions, so when the sheet cache hands over a reloaded frame, `extend()`
+compares the hashes of a sample of the indexed rows (evenly spaced, plus the
+last `CHECK_ROWS`): when rows already indexed were edited, removed or reordered
+(e.g. Data rows moving in or out of quarantine), the table is indexed again
+from scratch. The same frame as last time costs nothing. Queries look like
+
+    heart disease user_name:alice label:gold datagroup:12
+"""
+import logging
+import re
+import shlex
+import threading
+from array import array
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = r"\w+"
+TEXT_COLUMNS = ['reference', 'sentence']
+KEY_COLUMNS = ['dataId', 'datagroup', 'user_name', 'label']
+CHECK_ROWS = 1000  # Indexed rows compared when a reloaded frame comes in (spread out, and again at the end)
+
+
+def tokenize(text):
+    return re.findall(WORD_PATTERN, str(text).lower())
+
+
+def _postings(values, start):
+    """{value: uint32 row numbers} for a Series of hashable values indexed 0..n-1."""
+    keys = values.to_numpy(dtype=object).astype(str)
+    order = np.argsort(keys, kind='stable')  # Stable, so every value's row numbers stay sorted
+    keys = keys[order]
+    rows = (values.index.to_numpy(dtype=np.int64) + start)[order]
+    unique, first = np.unique(keys, return_index=True)
+    return zip(unique.tolist(), np.split(rows.astype(np.uint32), first[1:]))
+
+
+class TableIndex:
+    """Word and key indexes over one table; rebuilt when rows already indexed changed."""
+
+    def __init__(self, text_columns=TEXT_COLUMNS, key_columns=KEY_COLUMNS):
+        self.text_columns = text_columns
+        self.key_columns = key_columns
+        self.rows = 0
+        self._frame = None
+        self._terms = {}  # word -> array('I') of row numbers
+        self._keys = {}  # (column, value) -> array('I') of row numbers
+        self._check_rows = np.empty(0, dtype=np.int64)  # Sampled indexed rows and their hashes
+        self._check_hashes = np.empty(0, dtype=np.uint64)
+        self._lock = threading.Lock()  # Guards the indexes against concurrent searches
+        self._extending = threading.Lock()  # One extend at a time, so no row is indexed twice
+
+    def _add(self, index, entries):
+        for key, rows in entries:
+            postings = index.get(key)
+            if postings is None:
+                postings = index[key] = array('I')
+            postings.frombytes(rows.tobytes())
+
+    def _row_hashes(self, df):
+        columns = [c for c in self.text_columns + self.key_columns if c in df.columns]
+        if not columns or not len(df):
+            return np.zeros(len(df), dtype=np.uint64)
+        return pd.util.hash_pandas_object(df[columns].astype(str), index=False).to_numpy()
+
+    def _changed(self, df):
+        """Whether rows already indexed differ in `df`, judged by the sampled rows."""
+        if len(df) < self.rows:
+            return True
+        return not np.array_equal(self._row_hashes(df.iloc[self._check_rows]), self._check_hashes)
+
+    def extend(self, df, chunk_size=20000):
+        """Index the rows of `df` past the ones already indexed (all of them if indexed rows changed)."""
+        with self._extending:
+            if df is self._frame and self.rows >= len(df):
+                return
+            if self.rows and df is not self._frame and self._changed(df):
+                with self._lock:
+                    self._terms, self._keys, self._frame, self.rows = {}, {}, None, 0
+            if self.rows >= len(df):
+                with self._lock:
+                    self._frame = df  # Same rows in a reloaded frame
+                return
+            for start in range(self.rows, len(df), chunk_size):
+                self._extend_chunk(df, start, df.iloc[start:start + chunk_size].reset_index(drop=True))
+            spread = np.linspace(0, self.rows - 1, min(CHECK_ROWS, self.rows)).astype(np.int64)
+            self._check_rows = np.union1d(spread, np.arange(max(self.rows - CHECK_ROWS, 0), self.rows))
+            self._check_hashes = self._row_hashes(df.iloc[self._check_rows])
+
+    def _extend_chunk(self, df, start, chunk):
+        words = [
+            chunk[column].astype(str).str.lower().str.findall(WORD_PATTERN).explode().dropna()
+            for column in self.text_columns if column in chunk.columns
+        ]
+        # Each word once per row, however often it occurs in it
+        pairs = pd.DataFrame({
+            'row': np.concatenate([w.index.to_numpy() for w in words]) if words else [],
+            'word': np.concatenate([w.to_numpy() for w in words]) if words else [],
+        }).drop_duplicates().sort_values('row', kind='stable')  # Postings in row order, as `_postings` keeps them
+        words = pd.Series(pairs['word'].to_numpy(), index=pairs['row'].to_numpy())
+        keys = [
+            ((column, value), rows)
+            for column in self.key_columns if column in chunk.columns
+            for value, rows in _postings(chunk[column].dropna().astype(str).str.lower(), start)
+        ]
+        with self._lock:
+            self._add(self._terms, _postings(words, start))
+            self._add(self._keys, keys)
+            self._frame = df
+            self.rows = start + len(chunk)
+
+    def _matches(self, postings):
+        # A copy: a live view would stop the array from growing on the next extend
+        return np.frombuffer(postings, dtype=np.uint32).copy() if postings else np.empty(0, dtype=np.uint32)
+
+    def search(self, words, filters, limit=200):
+        """(matching rows, total match count) for all `words` and `column: value` filters."""
+        with self._lock:
+            lists = [self._matches(self._terms.get(word)) for word in words]
+            lists += [self._matches(self._keys.get((column, str(value).lower()))) for column, value in filters]
+            frame = self._frame
+        if not lists or frame is None:
+            return pd.DataFrame(), 0
+        lists.sort(key=len)  # Intersect the rarest first
+        matches = lists[0]
+        for rows in lists[1:]:
+            if not len(matches):
+                break
+            matches = np.intersect1d(matches, rows, assume_unique=True)
+        return frame.iloc[matches[:limit]], len(matches)
+
+
+def parse_query(query):
+    """Free words and `column:value` filters (quote values with spaces)."""
+    words, filters = [], []
+    for part in shlex.split(query):
+        column, sep, value = part.partition(":")
+        if sep and column in KEY_COLUMNS:
+            filters.append((column, value))
+        else:
+            words += tokenize(part)
+    return words, filters
+
+
+class SearchIndex:
+    """One TableIndex per sheet."""
+
+    def __init__(self):
+        self.tables = {}
+        self._updating = threading.Lock()
+
+    def table(self, name):
+        if name not in self.tables:
+            self.tables[name] = TableIndex()
+        return self.tables[name]
+
+    def extend(self, name, df):
+        self.table(name).extend(df)
+
+    def update_in_background(self, loaders):
+        """Index new rows of every table on a thread; `loaders` maps table name -> function returning its frame.
+
+        Returns at once; does nothing while the previous update is still running.
+        """
+        if not self._updating.acquire(blocking=False):
+            return
+
+        def update():
+            try:
+                for name, load in loaders.items():
+                    try:
+                        self.extend(name, load())
+                    except Exception:
+                        logger.exception("Indexing %s failed", name)  # The other tables are still updated
+            finally:
+                self._updating.release()
+        threading.Thread(target=update, name="search-index", daemon=True).start()
+
+    def is_updating(self):
+        return self._updating.locked()
+
+    def search(self, name, query, limit=200):
+        words, filters = parse_query(query)
+        return self.table(name).search(words, filters, limit)
+
+    def status(self):
+        return {name: table.rows for name, table in self.tables.items()}
@@ -0,0 +1,262 @@
+"""Split the Score sheet across worksheets (and spreadsheets) behind one logical table.
+
+Appends slow down as a worksheet grows and a spreadsheet holds at most 10M cells,
+so Score rows are written to numbered shards ("Score_0001", "Score_0002", ...).
+A shard is closed once it holds `max_rows` rows and the next append opens a new
+one. Rows can also be split by month or by datagroup range (`shard_by`). Once a
+spreadsheet holds `shards_per_spreadsheet` shards, new shards go to a freshly
+created spreadsheet.
+
+The "<name>_manifest" worksheet in the main spreadsheet lists every shard:
+
+    shard | spreadsheet | key | rows | status
+
+`spreadsheet` is empty for the main spreadsheet, `key` the month or datagroup
+range the shard holds and `rows` its row count once closed. Without a manifest
+the plain "Score" worksheet is the only shard, so existing sheets keep working;
+it is listed as the first shard on the first rollover.
+
+The manifest is only ever appended to, so replicas rolling over at the same
+time cannot overwrite each other's shards: closing a shard appends its row
+again with the new status, and the last row of a shard wins. A replica reads
+the manifest again right before adding a shard, and two replicas that still
+pick the same shard name simply share that worksheet.
+
+Spreadsheets created for new shards (`shards_per_spreadsheet`) are owned by the
+service account; share them with the team to open them in the browser.
+
+Rows are only appended when the newest shard's header is the table's layout, so
+rows are never written under the columns of a sheet that was not migrated yet
+(`schema.ScoreLayoutError`, run `migrate_scores.py`).
+
+Settings come from the `[score_shards]` section of the secrets:
+
+    [score_shards]
+    max_rows = 50000
+    shard_by = "month"            # or "datagroup"; omit to split by size only
+    datagroup_span = 100
+    shards_per_spreadsheet = 50
+"""
+import datetime
+import threading
+
+import pandas as pd
+
+from backend import WorksheetNotFound
+from schema import SCORE_SHEET_COLUMNS, ScoreLayoutError
+
+MANIFEST_COLUMNS = ['shard', 'spreadsheet', 'key', 'rows', 'status']
+
+
+def manifest_sheet(name):
+    return f"{name}_manifest"
+
+
+def plain_entry(name):
+    return {'shard': name, 'spreadsheet': '', 'key': '', 'rows': '', 'status': 'open'}
+
+
+def manifest_entries(backend, name="Score"):
+    """Entries listed in the manifest, latest row per shard, in the order shards were added."""
+    try:
+        manifest = backend.read(manifest_sheet(name))
+    except WorksheetNotFound:
+        return []
+    entries = {}
+    for entry in manifest.astype(object).to_dict('records'):
+        entry = {column: ('' if pd.isna(value) else value) for column, value in entry.items()}
+        entries[str(entry['shard'])] = entry  # A later row of the same shard replaces it in place
+    return list(entries.values())
+
+
+def read_manifest(backend, name="Score"):
+    """Manifest entries as dicts; the plain `name` worksheet alone if there is no manifest."""
+    return manifest_entries(backend, name) or [plain_entry(name)]
+
+
+def shard_sources(backend, name="Score"):
+    """(backend, worksheet) for every shard of the table, oldest first."""
+    backends = {'': backend}
+    sources = []
+    for entry in read_manifest(backend, name):
+        spreadsheet = str(entry['spreadsheet'])
+        if spreadsheet not in backends:
+            backends[spreadsheet] = backend.sibling(spreadsheet)
+        sources.append((backends[spreadsheet], str(entry['shard'])))
+    return sources
+
+
+class ShardedTable:
+    """One logical table stored in numbered worksheets listed in a manifest."""
+
+    def __init__(self, backend, name="Score", max_rows=50000, shard_by=None, datagroup_span=100,
+                 shards_per_spreadsheet=None, header=SCORE_SHEET_COLUMNS):
+        self.backend = backend
+        self.name = name
+        self.header = header  # Columns of the first shard when the table does not exist yet
+        self.max_rows = max_rows
+        self.shard_by = shard_by
+        self.datagroup_span = datagroup_span
+        self.shards_per_spreadsheet = shards_per_spreadsheet
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._header = None
+        self._backends = {'': backend}
+
+    @classmethod
+    def from_config(cls, backend, config, name="Score", header=SCORE_SHEET_COLUMNS):
+        return cls(
+            backend, name,
+            max_rows=config.get('max_rows', 50000),
+            shard_by=config.get('shard_by'),
+            datagroup_span=config.get('datagroup_span', 100),
+            shards_per_spreadsheet=config.get('shards_per_spreadsheet'),
+            header=header,
+        )
+
+    def _backend(self, spreadsheet):
+        spreadsheet = str(spreadsheet)
+        if spreadsheet not in self._backends:
+            self._backends[spreadsheet] = self.backend.sibling(spreadsheet)
+        return self._backends[spreadsheet]
+
+    def shard_key(self, row, header):
+        """Which split a row belongs to: '' when splitting by size only."""
+        if self.shard_by == 'month':
+            return datetime.date.today().strftime('%Y-%m')
+        if self.shard_by == 'datagroup':
+            start = int(row[header.index('datagroup')]) // self.datagroup_span * self.datagroup_span
+            return f"{start}-{start + self.datagroup_span - 1}"
+        return ''
+
+    # --- Reads ---
+    def read(self):
+        """All shards concatenated into one DataFrame (one batchGet per spreadsheet)."""
+        by_backend = {}
+        for backend, shard in shard_sources(self.backend, self.name):
+            by_backend.setdefault(id(backend), (backend, []))[1].append(shard)
+        frames = []
+        for backend, shards in by_backend.values():
+            frames.extend(frame for frame in backend.read_many(shards) if len(frame.columns))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    # --- Writes ---
+    def _open_shard(self, key):
+        for entry in self._manifest:
+            if entry['status'] == 'open' and str(entry['key']) == key:
+                return entry
+        return None
+
+    def _append_manifest(self, entries):
+        sheetname = manifest_sheet(self.name)
+        self.backend.ensure_sheet(sheetname, MANIFEST_COLUMNS)
+        self.backend.append_rows(sheetname, [[entry[column] for column in MANIFEST_COLUMNS] for entry in entries])
+
+    def _new_shard(self, key, header):
+        """Add the next numbered shard for `key`, in a new spreadsheet if the current one is full."""
+        # Other replicas may have added shards since this one last read the manifest
+        listed = manifest_entries(self.backend, self.name)
+        self._manifest = listed or [plain_entry(self.name)]
+        entry = self._open_shard(key)
+        if entry is not None:
+            return entry
+        shard = f"{self.name}_{len(self._manifest):04d}"
+        spreadsheet = str(self._manifest[-1]['spreadsheet'])
+        in_spreadsheet = sum(str(entry['spreadsheet']) == spreadsheet for entry in self._manifest)
+        if self.shards_per_spreadsheet and in_spreadsheet >= self.shards_per_spreadsheet:
+            spreadsheet = self.backend.create_spreadsheet(f"{shard} and later")
+        entry = {
+            'shard': shard,
+            'spreadsheet': spreadsheet,
+            'key': key,
+            'rows': '',
+            'status': 'open',
+        }
+        self._backend(spreadsheet).ensure_sheet(entry['shard'], header)
+        # The plain worksheet is listed first when the manifest is created
+        self._append_manifest(([] if listed else self._manifest) + [entry])
+        self._manifest.append(entry)
+        return entry
+
+    def _shard_header(self):
+        """Header of the newest shard (the table's layout if it does not exist yet)."""
+        if self._header is None:
+            latest = self._manifest[-1]
+            try:
+                self._header = self._backend(latest['spreadsheet']).header(str(latest['shard']))
+            except WorksheetNotFound:
+                pass
+            self._header = self._header or self.header
+        return self._header
+
+    def append_rows(self, rows):
+        """Append rows to the open shard of their key, rolling over once a shard is full."""
+        with self._lock:
+            if self._manifest is None:
+                self._manifest = read_manifest(self.backend, self.name)
+            header = self._shard_header()
+            if list(header) != list(self.header):
+                self._header = None  # Read again next time, the sheet may have been migrated meanwhile
+                raise ScoreLayoutError(
+                    f"{self.name} has the columns {header}, but rows are written as {list(self.header)}; "
+                    f"run migrate_scores.py first"
+                )
+            by_key = {}
+            for row in rows:
+                by_key.setdefault(self.shard_key(row, header), []).append(row)
+            for key, key_rows in by_key.items():
+                self._append(key, key_rows, header)
+
+    def _append(self, key, rows, header):
+        entry = self._open_shard(key) or self._new_shard(key, header)
+        backend = self._backend(entry['spreadsheet'])
+        try:
+            last_row = backend.append_rows(str(entry['shard']), rows)
+        except WorksheetNotFound:
+            # First write to a table that does not exist yet
+            backend.ensure_sheet(str(entry['shard']), header)
+            last_row = backend.append_rows(str(entry['shard']), rows)
+        if self.max_rows and last_row - 1 >= self.max_rows:
+            # Another process may have rolled over already; only its manifest is current
+            self._manifest = read_manifest(self.backend, self.name)
+            entry = next(e for e in self._manifest if str(e['shard']) == str(entry['shard']))
+            if entry['status'] == 'open':
+                entry['status'] = 'closed'
+                entry['rows'] = last_row - 1
+                self._append_manifest([entry])
+
+
+class ShardedBackend:
+    """Backend wrapper that reads and appends sharded tables as if they were one worksheet."""
+
+    def __init__(self, backend, tables):
+        self.backend = backend
+        self.tables = tables
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def read(self, sheetname):
+        if sheetname in self.tables:
+            return self.tables[sheetname].read()
+        return self.backend.read(sheetname)
+
+    def read_many(self, sheetnames):
+        plain = [name for name in sheetnames if name not in self.tables]
+        frames = dict(zip(plain, self.backend.read_many(plain))) if plain else {}
+        return [self.tables[name].read() if name in self.tables else frames[name] for name in sheetnames]
+
+    def append_rows(self, sheetname, rows):
+        if sheetname in self.tables:
+            return self.tables[sheetname].append_rows(rows)
+        return self.backend.append_rows(sheetname, rows)
+
+
+def shard_scores(backend, config, tables=None):
+    """Wrap `backend` so each table in `tables` (name -> header) is sharded with the `[score_shards]` settings."""
+    tables = tables or {"Score": SCORE_SHEET_COLUMNS}
+    return ShardedBackend(backend, {
+        name: ShardedTable.from_config(backend, config, name, header) for name, header in tables.items()
+    })
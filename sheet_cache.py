@@ -0,0 +1,136 @@
+"""Stale-while-revalidate cache for sheet loads.
+
+Only the very first load of a sheet blocks. After that, a read past
+`refresh_ahead * ttl` starts one background refresh for that sheet and keeps
+serving the cached copy until the refresh lands, so an expiring cache never makes
+every session wait on the API at once. A failed refresh keeps the stale copy and
+is retried after `retry_seconds`.
+
+Cached values are shared between sessions and threads: callers must not mutate them.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('value', 'loaded_at', 'refreshing', 'retry_at')
+
+    def __init__(self, value, loaded_at):
+        self.value = value
+        self.loaded_at = loaded_at
+        self.refreshing = False
+        self.retry_at = 0.0
+
+
+class SheetCache:
+    """Per-key cache with single-flight loading and background refresh."""
+
+    def __init__(self, loader, batch_loader=None, ttls=None, default_ttl=1200, refresh_ahead=0.8,
+                 retry_seconds=30, max_workers=4):
+        self.loader = loader
+        self.batch_loader = batch_loader
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.refresh_ahead = refresh_ahead
+        self.retry_seconds = retry_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._reads = {}  # (key, 'hit' | 'stale' | 'miss') -> count, for monitoring.py
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheet-cache")
+
+    def ttl(self, key):
+        return self.ttls.get(key, self.default_ttl)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _count(self, key, result):
+        with self._lock:
+            self._reads[key, result] = self._reads.get((key, result), 0) + 1
+
+    def stats(self):
+        """Reads so far by (key, result): 'hit', 'stale' (served while refreshing) or 'miss' (loaded)."""
+        with self._lock:
+            return dict(self._reads)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self._count(key, 'miss')
+            return self._load_blocking(key)
+        now = time.monotonic()
+        if now - entry.loaded_at >= self.refresh_ahead * self.ttl(key) and now >= entry.retry_at:
+            self._count(key, 'stale')
+            self.refresh(key)
+        else:
+            self._count(key, 'hit')
+        return entry.value
+
+    def get_many(self, keys):
+        """Values for several keys; cold keys are fetched together instead of one after another."""
+        cold = sorted({key for key in keys if key not in self._entries})
+        if cold:
+            for key in cold:
+                self._count(key, 'miss')
+            self._load_many_blocking(cold)
+        return [self._entries[key].value if key in cold else self.get(key) for key in keys]
+
+    def _load_many_blocking(self, keys):
+        # Locks are taken in sorted order so overlapping batches cannot deadlock
+        locks = [self._key_lock(key) for key in keys]
+        for lock in locks:
+            lock.acquire()
+        try:
+            missing = [key for key in keys if key not in self._entries]
+            if not missing:
+                return
+            if self.batch_loader is not None:
+                values = self.batch_loader(missing)
+            else:
+                values = list(self._executor.map(self.loader, missing))
+            now = time.monotonic()
+            for key, value in zip(missing, values):
+                self._entries[key] = _Entry(value, now)
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def _load_blocking(self, key):
+        # Single flight: concurrent cold reads of the same key wait for one load
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(self.loader(key), time.monotonic())
+                self._entries[key] = entry
+            return entry.value
+
+    def refresh(self, key):
+        """Start a background reload of `key` unless one is already running."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refreshing:
+                return
+            entry.refreshing = True
+        self._executor.submit(self._refresh, key, entry)
+
+    def _refresh(self, key, entry):
+        try:
+            value = self.loader(key)
+        except Exception:
+            logger.exception("Background refresh of %r failed; serving the stale copy", key)
+            entry.retry_at = time.monotonic() + self.retry_seconds
+            entry.refreshing = False
+            return
+        self._entries[key] = _Entry(value, time.monotonic())
+
+    def invalidate(self, key):
+        """Refresh `key` in the background on its next read."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.loaded_at = float('-inf')
@@ -0,0 +1,248 @@
+"""Slice discovery: where does each metric disagree with the human scores?
+
+Every rated pair gets a few cheap features: reference and target length, their
+ratio, token overlap, `label`, `datagroup` and whether a negation occurs (and on
+one side only). Numeric features are cut into quantile bins, and every slice of
+up to `max_depth` feature=value conditions is scored by how much larger the
+metric's error is inside the slice than outside it.
+
+All slices over one combination of features are aggregated at once with
+`np.bincount` over a combined code, and a combination is only extended with
+rows of slices that still have `min_size` pairs (a slice can only shrink when a
+condition is added), so thousands of candidate slices take seconds.
+
+The error of a metric is the distance between its percentile rank and the
+human score's percentile rank, or, with `--calibration` (see `calibrate.py`),
+the distance between its calibrated score and the human score in points.
+
+    python slices.py --top 10
+    python slices.py --input exports/scores.parquet --calibration calibration.json
+"""
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from backend import load_secrets
+from calibrate import SCORE_COLUMNS, Calibration, isotonic_predict, read_table, score_levels, sheet_scores
+from tasks import configured_tasks
+
+NEGATION_RE = re.compile(r"\b(?:no|not|never|none|nobody|nothing|neither|nor|without|cannot)\b|n't", re.IGNORECASE)
+TOKEN_RE = re.compile(r"\w+")
+NUMERIC_FEATURES = ['reference_length', 'sentence_length', 'length_ratio', 'token_overlap']
+
+
+# ===== FEATURES =====
+
+def pair_table(ratings, levels=None):
+    """One row per pair: mean human score and the pair's text, label and metric scores."""
+    ratings = ratings.assign(human_score=pd.to_numeric(ratings['human_score'], errors='coerce'))
+    # Only scores on the task's scale count (`levels`, see `calibrate.score_levels`)
+    ratings = ratings[ratings['human_score'].isin(levels) if levels is not None else ratings['human_score'].notna()]
+    columns = [c for c in ['datagroup', 'reference', 'sentence', 'label'] + SCORE_COLUMNS if c in ratings.columns]
+    pairs = ratings.groupby(ratings['dataId'].astype(str), sort=False).agg(
+        human_score=('human_score', 'mean'), ratings=('human_score', 'size'), **{c: (c, 'first') for c in columns}
+    )
+    return pairs.assign(**{c: pd.to_numeric(pairs[c], errors='coerce') for c in SCORE_COLUMNS if c in pairs})
+
+
+def pair_features(pairs):
+    """Cheap per-pair features (numeric ones still unbinned)."""
+    references = pairs['reference'].fillna("").astype(str)
+    sentences = pairs['sentence'].fillna("").astype(str)
+    reference_tokens = [set(TOKEN_RE.findall(text.lower())) for text in references]
+    sentence_tokens = [set(TOKEN_RE.findall(text.lower())) for text in sentences]
+    reference_length = np.array([len(TOKEN_RE.findall(text)) for text in references])
+    sentence_length = np.array([len(TOKEN_RE.findall(text)) for text in sentences])
+    overlap = np.array([len(a & b) / len(a | b) if a | b else 1.0 for a, b in zip(reference_tokens, sentence_tokens)])
+    reference_negated = references.str.contains(NEGATION_RE).to_numpy()
+    sentence_negated = sentences.str.contains(NEGATION_RE).to_numpy()
+
+    features = pd.DataFrame({
+        'reference_length': reference_length,
+        'sentence_length': sentence_length,
+        'length_ratio': np.minimum(reference_length, sentence_length) / np.maximum(
+            np.maximum(reference_length, sentence_length), 1),
+        'token_overlap': overlap,
+        'negation': reference_negated | sentence_negated,
+        'negation_mismatch': reference_negated != sentence_negated,
+    }, index=pairs.index)
+    for column in ['label', 'datagroup']:
+        if column in pairs.columns:
+            features[column] = pairs[column].astype(str)
+    return features
+
+
+def encode_features(features, bins=4, min_size=20):
+    """Integer codes per feature and the description of every code.
+
+    Numeric features become quantile bins; categories with fewer than `min_size`
+    pairs are left out (code -1), they could never form a slice.
+    """
+    codes, labels = {}, {}
+    for column in features.columns:
+        values = features[column]
+        if column in NUMERIC_FEATURES:
+            binned = pd.qcut(values, bins, duplicates='drop')
+            codes[column] = binned.cat.codes.to_numpy()
+            labels[column] = [f"{column} in {interval}" for interval in binned.cat.categories]
+        else:
+            categories = values.astype(str)
+            counts = categories.value_counts()
+            kept = counts[counts >= min_size].index
+            categorical = pd.Categorical(categories, categories=kept)
+            codes[column] = categorical.codes.astype(np.int64)
+            labels[column] = [f"{column} = {value}" for value in kept]
+    return codes, labels
+
+
+# ===== ERRORS =====
+
+def metric_errors(pairs, calibration=None):
+    """Per-pair error of every metric against the mean human score."""
+    errors = {}
+    for column in SCORE_COLUMNS:
+        if column not in pairs.columns or pairs[column].isna().all():
+            continue
+        if calibration is not None and column in calibration.columns:
+            model = calibration.artifact['models'][f"isotonic:{column}"]
+            predicted = isotonic_predict(model, pairs[column].to_numpy(dtype=float))
+            errors[column] = np.abs(predicted - pairs['human_score'].to_numpy())
+        else:
+            errors[column] = (pairs[column].rank(pct=True) - pairs['human_score'].rank(pct=True)).abs().to_numpy()
+    return errors
+
+
+# ===== SLICE SEARCH =====
+
+def _combined_codes(codes, sizes, features, rows):
+    """Slice number over `features` for each row in `rows`."""
+    combined = np.zeros(rows.sum(), dtype=np.int64)
+    for feature in features:
+        combined = combined * sizes[feature] + codes[feature][rows]
+    return combined
+
+
+def _decode(code, features, sizes):
+    values = []
+    for feature in reversed(features):
+        code, value = divmod(code, sizes[feature])
+        values.append(value)
+    return list(reversed(values))
+
+
+def find_slices(codes, labels, error, max_depth=2, min_size=20, min_effect=0.3):
+    """Slices where `error` is worst, as a DataFrame sorted by effect size.
+
+    The effect size is the difference between the mean error inside and outside
+    the slice, divided by their pooled standard deviation.
+    """
+    error = error.astype(float)
+    valid = ~np.isnan(error)
+    error = np.where(valid, error, 0.0)
+    sizes = {feature: len(labels[feature]) for feature in codes}
+    features = [feature for feature in codes if sizes[feature]]
+    total_count, total_sum, total_squares = valid.sum(), error.sum(), (error ** 2).sum()
+
+    found = []
+    frontier = {(): valid}  # feature combination -> rows that are in a large enough parent slice
+    for depth in range(1, max_depth + 1):
+        next_frontier = {}
+        for parent, parent_rows in frontier.items():
+            start = features.index(parent[-1]) + 1 if parent else 0
+            for feature in features[start:]:
+                combination = parent + (feature,)
+                rows = parent_rows & (codes[feature] >= 0)
+                if rows.sum() < min_size:
+                    continue
+                combined = _combined_codes(codes, sizes, combination, rows)
+                length = int(np.prod([sizes[f] for f in combination]))
+                values = error[rows]
+                count = np.bincount(combined, minlength=length)
+                total = np.bincount(combined, values, minlength=length)
+                squares = np.bincount(combined, values * values, minlength=length)
+                large = np.flatnonzero(count >= min_size)
+                if not len(large):
+                    continue
+
+                # Effect size of each large slice against the rest of the pairs
+                n_in, sum_in, sq_in = count[large], total[large], squares[large]
+                n_out = total_count - n_in
+                mean_in = sum_in / n_in
+                mean_out = np.where(n_out > 0, (total_sum - sum_in) / np.maximum(n_out, 1), mean_in)
+                var_in = np.maximum(sq_in / n_in - mean_in ** 2, 0)
+                var_out = np.maximum((total_squares - sq_in) / np.maximum(n_out, 1) - mean_out ** 2, 0)
+                pooled = np.sqrt((var_in + var_out) / 2)
+                effect = (mean_in - mean_out) / np.where(pooled > 0, pooled, np.inf)
+                t = (mean_in - mean_out) / np.sqrt(var_in / n_in + var_out / np.maximum(n_out, 1) + 1e-12)
+
+                for i in np.flatnonzero(effect >= min_effect):
+                    values = _decode(int(large[i]), combination, sizes)
+                    found.append({
+                        'slice': " & ".join(labels[f][v] for f, v in zip(combination, values)),
+                        'depth': depth,
+                        'size': int(n_in[i]),
+                        'error': round(float(mean_in[i]), 4),
+                        'error_elsewhere': round(float(mean_out[i]), 4),
+                        'effect_size': round(float(effect[i]), 3),
+                        't': round(float(t[i]), 2),
+                    })
+
+                # Only rows in slices that are still large enough are worth extending
+                if depth < max_depth:
+                    in_large = np.zeros(length, dtype=bool)
+                    in_large[large] = True
+                    extend = rows.copy()
+                    extend[rows] = in_large[combined]
+                    next_frontier[combination] = extend
+        frontier = next_frontier
+
+    columns = ['slice', 'depth', 'size', 'error', 'error_elsewhere', 'effect_size', 't']
+    return pd.DataFrame(found, columns=columns).sort_values('effect_size', ascending=False, ignore_index=True)
+
+
+def discover_slices(ratings, calibration=None, bins=4, max_depth=2, min_size=20, min_effect=0.3, levels=None):
+    """Metric column -> its worst slices."""
+    pairs = pair_table(ratings, levels)
+    codes, labels = encode_features(pair_features(pairs), bins, min_size)
+    return {
+        column: find_slices(codes, labels, error, max_depth, min_size, min_effect)
+        for column, error in metric_errors(pairs, calibration).items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the pairs where each metric disagrees with the human scores.")
+    parser.add_argument("--input", help="Exported Score rows with pair data (parquet/jsonl/csv) instead of the sheets")
+    parser.add_argument("--sheet", default="Score",
+                        help="Score worksheet to read (or the --input rows came from); its task sets the scale")
+    parser.add_argument("--calibration", help="Artifact from calibrate.py; errors are then in human score points")
+    parser.add_argument("--bins", type=int, default=4, help="Quantile bins per numeric feature")
+    parser.add_argument("--max-depth", type=int, default=2, help="Most conditions per slice")
+    parser.add_argument("--min-size", type=int, default=20, help="Fewest pairs in a slice")
+    parser.add_argument("--min-effect", type=float, default=0.3, help="Smallest effect size reported")
+    parser.add_argument("--top", type=int, default=10, help="Slices shown per metric")
+    parser.add_argument("--output", help="Also write every slice found to this CSV")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    args = parser.parse_args()
+
+    secrets = load_secrets(args.secrets) if not args.input or os.path.exists(args.secrets) else {}
+    levels = score_levels(configured_tasks(secrets.get("tasks", {})), args.sheet)
+    ratings = read_table(args.input) if args.input else sheet_scores(secrets, args.sheet)
+    calibration = Calibration.load(args.calibration) if args.calibration else None
+    results = discover_slices(
+        ratings, calibration, args.bins, args.max_depth, args.min_size, args.min_effect, levels
+    )
+
+    with pd.option_context('display.max_colwidth', 120, 'display.width', 200):
+        for column, found in results.items():
+            print(f"\n== {column}: {len(found)} slices ==")
+            print(found.head(args.top).to_string(index=False) if len(found) else "No slice stands out.")
+    if args.output:
+        pd.concat([found.assign(metric=column) for column, found in results.items()]).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Pre-rendered HTML snippets for the instructions, examples and score display.
+
+The snippets only depend on a score or a short text, so they are built once per
+process and reused by every rerun instead of being formatted again each time.
+"""
+from functools import lru_cache
+
+score_colors = {
+    0: "#cccccc",  # Gray (unchanged)
+    1: "#FFA000",  # Darker orange (replaced red)
+    2: "#FFC107",  # Amber (previously orange)
+    3: "#FFD54F",  # Light amber (previously yellow)
+    4: "#8BC34A",  # Light green (unchanged)
+    5: "#4CAF50"   # Green (unchanged)
+}
+
+score_descriptions = {
+    0: "Not Rated", 1: "Contradiction/Irrelevance", 2: "Significant Deviation",
+    3: "Partial Match", 4: "Close Match", 5: "Semantic Equivalence"
+}
+
+# Example data - static values
+EXAMPLES = [
+    {
+        'reference': "The watermelon seeds pass through your digestive system.",
+        'sentence': "The watermelon seeds will be excreted.",
+        'score': 5,
+        'explanation': "The sentences use different phrasing but preserve identical core meaning about seeds passing through the body, earning a score of 5 (Semantic Equivalence).",
+    },
+    {
+        'reference': "The watermelon seeds pass through your digestive system.",
+        'sentence': "You grow watermelons in your stomach.",
+        'score': 1,
+        'explanation': "The sentences share similar elements (watermelon seeds and stomach) but convey different meanings, leading to a score of 1 (Contradiction/Irrelevance).",
+    },
+]
+
+BOX_STYLES = {
+    'reference': "border-left:4px solid #4e79a7; border-radius:5px; margin-bottom:15px;",
+    'target': "border-left:4px solid #e15759; border-radius:5px; margin-bottom:20px;",
+}
+
+
+@lru_cache(maxsize=None)
+def score_visualization_html(current_score):
+    return f"""
+    <div class="score-visualization">
+        <div class="score-labels">
+            <span style="color:{score_colors[0]};">0</span>
+            <span style="color:{score_colors[1]};">1</span>
+            <span style="color:{score_colors[2]};">2</span>
+            <span style="color:{score_colors[3]};">3</span>
+            <span style="color:{score_colors[4]};">4</span>
+            <span style="color:{score_colors[5]};">5</span>
+        </div>
+        <div class="score-bar-container">
+            <div class="score-bar" style="width:{current_score * 20}%; background:{"#f44336"};"></div>
+        </div>
+        <div class="score-indicator">
+            Selected: <span class="score-value" style="color:{score_colors[current_score]};">{current_score}</span> • {score_descriptions[current_score]}
+        </div>
+    </div>
+    """
+
+
+def metric_color(score):
+    return "#e15759" if score >= 0.7 else "#4e79a7" if score < 0.4 else "#f28e2b"
+
+
+@lru_cache(maxsize=4096)
+def metric_card_html(label, score):
+    """Color-coded card for one metric score of the ranking tasks."""
+    return (
+        f'<div style="background:#f0f0f0; padding:10px; border-radius:5px; text-align:center; margin-bottom:10px;">'
+        f'<p style="margin:0; font-weight:bold;">Metric {label}</p>'
+        f'<p style="margin:0; font-size:24px; color:{metric_color(score)};">{score:.2f}</p>'
+        f'</div>'
+    )
+
+
+@lru_cache(maxsize=4096)
+def text_box_html(text, kind):
+    """Reference (`kind='reference'`) or target sentence box."""
+    return (
+        f'<div style="background:#f9f9f9; padding:12px; {BOX_STYLES[kind]}">'
+        f'{text}'
+        f'</div>'
+    )
+
+
+def prerender():
+    """Build every static snippet up front (called by the warm-up)."""
+    for score in score_colors:
+        score_visualization_html(score)
+    for example in EXAMPLES:
+        text_box_html(example['reference'], 'reference')
+        text_box_html(example['sentence'], 'target')
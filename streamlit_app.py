@@ -1,7 +1,22 @@
+import time
+import uuid
+
 import streamlit as st
-import pandas as pd
-import gspread
-from google.oauth2 import service_account
+
+from monitoring import SUBMIT_ERRORS
+from progressive import ProgressiveCommit
+from quality import FLAGGED_COLUMNS, SessionMonitor, flagged_rows, is_gold, seed_gold_items
+from resources import (
+    append_rows, append_rows_async, current_project, get_backend, get_group_store, get_sampler,
+    get_session_registry, get_sheet_cache, get_tasks, load_sheets, track_rerun
+)
+from static_html import EXAMPLES, score_colors, score_visualization_html, text_box_html
+from token_diff import DIFF_CSS, group_diffs
+
+# Datagroup option that builds a group on the fly from the active sampler
+AUTO_GROUP = "Auto (most informative pairs)"
+AUTO_GROUP_SIZE = 10
+GOLD_ITEMS_PER_GROUP = 1
 
 # ===== CSS STYLING =====
 
@@ -72,68 +87,52 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-score_colors = {
-    0: "#cccccc",  # Gray (unchanged)
-    1: "#FFA000",  # Darker orange (replaced red)
-    2: "#FFC107",  # Amber (previously orange)
-    3: "#FFD54F",  # Light amber (previously yellow)
-    4: "#8BC34A",  # Light green (unchanged)
-    5: "#4CAF50"   # Green (unchanged)
-}
-
-score_descriptions = {
-    0: "Not Rated", 1: "Contradiction/Irrelevance", 2: "Significant Deviation",
-    3: "Partial Match", 4: "Close Match", 5: "Semantic Equivalence"
-}
-
 # Score display function
 def show_score(current_score):
-    
-    st.markdown(f"""
-    <div class="score-visualization">
-        <div class="score-labels">
-            <span style="color:{score_colors[0]};">0</span>
-            <span style="color:{score_colors[1]};">1</span>
-            <span style="color:{score_colors[2]};">2</span>
-            <span style="color:{score_colors[3]};">3</span>
-            <span style="color:{score_colors[4]};">4</span>
-            <span style="color:{score_colors[5]};">5</span>
-        </div>
-        <div class="score-bar-container">
-            <div class="score-bar" style="width:{current_score * 20}%; background:{"#f44336"};"></div>
-        </div>
-        <div class="score-indicator">
-            Selected: <span class="score-value" style="color:{score_colors[current_score]};">{current_score}</span> • {score_descriptions[current_score]}
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(score_visualization_html(current_score), unsafe_allow_html=True)
+
+
+def save_evaluation(session, human_score):
+    """Store the current sample's score, its dwell time, and feed the quality monitor."""
+    sample_idx = st.session_state.current_sample
+    previous = session['evaluations'].get(sample_idx, {})
+    dwell = previous.get('dwell_seconds', 0.0) + time.monotonic() - st.session_state.sample_started
+    session['evaluations'][sample_idx] = {
+        'human_score': human_score,
+        'dwell_seconds': dwell
+    }
+    if human_score:
+        session['monitor'].observe(sample_idx, human_score, dwell, session['sample_ids'][sample_idx])
 
 
+def score_rows(session):
+    """Score rows of the rated samples, by sample index."""
+    store = get_group_store(project)
+    rows = {}
+    for sample_idx, evaluation in session['evaluations'].items():
+        sample_data = store.row(session['sample_ids'][sample_idx])
+        if is_gold(sample_data['dataId']) or not evaluation['human_score']:
+            continue  # Gold items only feed quality control
+        # Ids and the annotation only; pair data is joined from the Data sheet
+        # Data rows are typed when the sheet is loaded, so no per-row casts here
+        rows[sample_idx] = [
+            sample_data['datagroup'],
+            st.session_state.user_name, 
+            sample_data['dataId'],
+            evaluation['human_score']
+        ]
+    return rows
 
-# --- SETUP GOOGLE SHEETS CONNECTION ---
-@st.cache_resource(ttl=1200)  # Cache the connection for 20 minutes
-def get_gsheets_connection():
-    """Authenticate and return a gspread client."""
-    credentials = service_account.Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"],
-        scopes=["https://www.googleapis.com/auth/spreadsheets"],
-    )
-    return gspread.authorize(credentials)
 
-@st.cache_data(ttl=1200)  # Cache the data for 20 minutes
-def load_data(sheetname):
-    """Load data from Google Sheets with caching."""
-    gc = get_gsheets_connection()
-    sheet = gc.open_by_url(st.secrets["connections"]["gsheets"]["spreadsheet"])
-    worksheet = sheet.worksheet(sheetname)
-    return pd.DataFrame(worksheet.get_all_records())
+def write_scores(rows):
+    return append_rows_async(project, task['score_sheet'], rows)  # Goes to the open Score shard
 
 
 # Initialize session state variables
 if 'current_sample' not in st.session_state:
     st.session_state.current_sample = 0
-if 'evaluations' not in st.session_state:
-    st.session_state.evaluations = {}
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if 'loaded_data' not in st.session_state:
     st.session_state.loaded_data = None
 if 'user_name' not in st.session_state:
@@ -144,14 +143,30 @@ if 'total_samples' not in st.session_state:
     st.session_state.total_samples = 0
 
 
-df = load_data("Data")
-df_finished = load_data("Finished")
-df['datagroup'] = df['datagroup'].astype(int)
+project = current_project()
+track_rerun("semantic_match")
+
+# Per-session working state lives in the shared registry; session_state only keeps ids and the cursor
+registry = get_session_registry()
+for evicted in registry.evict_idle():
+    if evicted['data_group'] == AUTO_GROUP:
+        get_sampler(evicted['project']).release(evicted['sample_ids'])  # Hand leased pairs back to the queue
+session = registry.get(st.session_state.session_id)
+if session is not None and session['project'] != project:
+    # The URL switched projects; the loaded group belongs to the other one
+    registry.drop(st.session_state.session_id)
+    session = None
+if st.session_state.data_group is not None and session is None:
+    st.session_state.data_group = None
+    st.session_state.current_sample = 0
+    st.warning("Your session expired after being idle. Please load your data group again.")
+
+task = get_tasks(project)['semantic_match']  # Sheet names, overridable under [tasks.semantic_match]
+df, df_finished = load_sheets(project, "Data", task['finished_sheet'])
 
 # filtered the datagroup that are already finished
 if len(df_finished) > 0:
-    df_finished['datagroup'] = df_finished['datagroup'].astype(int)
-    df = df[~df['datagroup'].isin(df_finished['datagroup'])]
+    df = df[~df['datagroup'].isin(df_finished['datagroup'].astype(int))]
 
 
 # At the top of your script or in the main display logic
@@ -251,76 +266,23 @@ else:
         """)
         # st.markdown("Here's how the evaluation will look:")
         
-        # Example data - static values
-
-        example1 = {
-            'reference': "The watermelon seeds pass through your digestive system.",
-            'sentence': "The watermelon seeds will be excreted.",
-            "score": 5
-        }
-        example2 = {
-            'reference': "The watermelon seeds pass through your digestive system.",
-            'sentence': "You grow watermelons in your stomach.",
-            "score": 1
-        }
-        
-        st.markdown("##### Example 1:")
-        # Display container with improved spacing
-        with st.container(border=True):
-            # Reference and target Sentence
-            st.markdown("**Reference**")
-            st.markdown(
-                f'<div style="background:#f9f9f9; padding:12px; border-left:4px solid #4e79a7; border-radius:5px; margin-bottom:15px;">'
-                f'{example1["reference"]}'
-                f'</div>', 
-                unsafe_allow_html=True
-            )
-
-            st.markdown("**Target Sentence**")
-            st.markdown(
-                f'<div style="background:#f9f9f9; padding:12px; border-left:4px solid #e15759; border-radius:5px; margin-bottom:20px;">'
-                f'{example1["sentence"]}'
-                f'</div>', 
-                unsafe_allow_html=True
-            )
-
-            # --- Task 1: Alignment Score ---
-            st.markdown("#### Task: Semantic Match Score (1-5)")
-            st.markdown("**How well does the target sentence match the reference?**")
-            
-
-            # Score display - replace 'current_score' with your variable
-            show_score(example1["score"])
-            st.markdown("**Explanation**: The sentences use different phrasing but preserve identical core meaning about seeds passing through the body, earning a score of 5 (Semantic Equivalence).")
-        
-        st.markdown("##### Example 2:")
-        with st.container(border=True):
-            # Reference and target Sentence
-            st.markdown("**Reference**")
-            st.markdown(
-                f'<div style="background:#f9f9f9; padding:12px; border-left:4px solid #4e79a7; border-radius:5px; margin-bottom:15px;">'
-                f'{example2["reference"]}'
-                f'</div>', 
-                unsafe_allow_html=True
-            )
+        for i, example in enumerate(EXAMPLES, 1):
+            st.markdown(f"##### Example {i}:")
+            # Display container with improved spacing
+            with st.container(border=True):
+                # Reference and target Sentence
+                st.markdown("**Reference**")
+                st.markdown(text_box_html(example["reference"], 'reference'), unsafe_allow_html=True)
 
-            st.markdown("**Target Sentence**")
-            st.markdown(
-                f'<div style="background:#f9f9f9; padding:12px; border-left:4px solid #e15759; border-radius:5px; margin-bottom:20px;">'
-                f'{example2["sentence"]}'
-                f'</div>', 
-                unsafe_allow_html=True
-            )
+                st.markdown("**Target Sentence**")
+                st.markdown(text_box_html(example["sentence"], 'target'), unsafe_allow_html=True)
 
-            # --- Task 1: Alignment Score ---
-            st.markdown("#### Task: Semantic Match Score (1-5)")
-            st.markdown("**How well does the target sentence match the reference?**")
-            
+                # --- Task 1: Alignment Score ---
+                st.markdown("#### Task: Semantic Match Score (1-5)")
+                st.markdown("**How well does the target sentence match the reference?**")
 
-            # Score display - replace 'current_score' with your variable
-            show_score(example2["score"])
-            st.markdown("**Explanation**: The sentences share similar elements (watermelon seeds and stomach) but convey different meanings, leading to a score of 1 (Contradiction/Irrelevance).")
-            
+                show_score(example["score"])
+                st.markdown(f"**Explanation**: {example['explanation']}")
 
         st.markdown("---")  # Separator before the actual form
         
@@ -330,7 +292,7 @@ else:
             with col1:
                 data_group = st.selectbox(
                     "Data Group", 
-                    [''] + sorted(df['datagroup'].unique().tolist()), 
+                    ['', AUTO_GROUP] + sorted(df['datagroup'].unique().tolist()), 
                     key="datagroup_select"
                 )
             with col2:
@@ -342,13 +304,36 @@ else:
             submitted = st.form_submit_button("Load Data")
 
         if submitted and data_group and name:
-            data_group = int(data_group)
-            st.session_state.user_name = name
-            st.session_state.data_group = data_group
-            st.session_state.group_samples = df[df['datagroup'] == data_group].reset_index(drop=True)
-            st.session_state.total_samples = len(st.session_state.group_samples)
-            st.session_state.current_sample = 0 
-            st.rerun()
+            if data_group == AUTO_GROUP:
+                sample_ids = get_sampler(project).next_group(AUTO_GROUP_SIZE)
+            else:
+                data_group = int(data_group)
+                sample_ids = get_group_store(project).group_ids(data_group)
+                # Skip pairs whose human score is already confident
+                retired = get_sampler(project).is_retired(sample_ids)
+                sample_ids = [key for key, r in zip(sample_ids, retired) if not r]
+
+            if not sample_ids:
+                st.warning("No pairs are available right now, please try again later.")
+            else:
+                st.session_state.user_name = name
+                st.session_state.data_group = data_group
+                sample_ids = tuple(seed_gold_items(sample_ids, GOLD_ITEMS_PER_GROUP))
+                store = get_group_store(project)
+                session = registry.create(
+                    st.session_state.session_id,
+                    project=project,
+                    data_group=data_group,
+                    sample_ids=sample_ids,
+                    # Token highlighting of every pair in the group, built once here (see token_diff.py)
+                    diffs=group_diffs(store.row(key) for key in sample_ids),
+                    evaluations={},
+                    monitor=SessionMonitor(),
+                    commits=ProgressiveCommit(task['commit_every'])
+                )
+                st.session_state.total_samples = len(session['sample_ids'])
+                st.session_state.current_sample = 0 
+                st.rerun()
 
     if st.session_state.data_group is not None and st.session_state.current_sample >= 0:
         # Progress bar
@@ -405,26 +390,29 @@ else:
         st.markdown(" ")
 
         # Get current sample data
-        current_data = st.session_state.group_samples.iloc[st.session_state.current_sample]
+        store = get_group_store(project)
+        current_data = store.row(session['sample_ids'][st.session_state.current_sample])
+
+        # Start the dwell timer the first time this sample is shown
+        if st.session_state.get('timed_sample') != st.session_state.current_sample:
+            st.session_state.timed_sample = st.session_state.current_sample
+            st.session_state.sample_started = time.monotonic()
+
+        # Optional token-level highlighting, precomputed when the group was loaded
+        diff = None
+        if st.toggle("Highlight differences", key="highlight_diff"):
+            diff = session['diffs'].get(str(current_data['dataId']))
+            st.markdown(DIFF_CSS, unsafe_allow_html=True)
+        reference_html, sentence_html = diff or (current_data["reference"], current_data["sentence"])
         
         # Display evaluation form
         with st.form(f"evaluation_form_{st.session_state.current_sample}"):
             # Reference and target Sentence
             st.markdown("**Reference**")
-            st.markdown(
-                f'<div style="background:#f9f9f9; padding:12px; border-left:4px solid #4e79a7; border-radius:5px; margin-bottom:15px;">'
-                f'{current_data["reference"]}'
-                f'</div>', 
-                unsafe_allow_html=True
-            )
+            st.markdown(text_box_html(reference_html, 'reference'), unsafe_allow_html=True)
 
             st.markdown("**Target Sentence**")
-            st.markdown(
-                f'<div style="background:#f9f9f9; padding:12px; border-left:4px solid #e15759; border-radius:5px; margin-bottom:20px;">'
-                f'{current_data["sentence"]}'
-                f'</div>', 
-                unsafe_allow_html=True
-            )
+            st.markdown(text_box_html(sentence_html, 'target'), unsafe_allow_html=True)
 
             # --- Task 1: Semantic Match Score ---
             st.markdown("#### Task 1: Semantic Match Score (1-5)")
@@ -443,7 +431,7 @@ else:
             """, unsafe_allow_html=True)
             
             # Load previous evaluation if exists
-            current_eval = st.session_state.evaluations.get(st.session_state.current_sample, {})
+            current_eval = session['evaluations'].get(st.session_state.current_sample, {})
             
             human_score = st.slider(
                 "Score (0-5)",
@@ -460,9 +448,7 @@ else:
                 if st.session_state.current_sample > 0:
                     if st.form_submit_button("⏮ Previous"):
                         # Save current evaluation before moving
-                        st.session_state.evaluations[st.session_state.current_sample] = {
-                            'human_score': human_score
-                        }
+                        save_evaluation(session, human_score)
                         st.session_state.current_sample -= 1
                         st.rerun()
             
@@ -474,9 +460,9 @@ else:
                             st.error("Please provide a score between 1 and 5")
                         else:
                             # Save current evaluation before moving
-                            st.session_state.evaluations[st.session_state.current_sample] = {
-                                'human_score': human_score
-                            }
+                            save_evaluation(session, human_score)
+                            # Write a batch once enough samples are done (no-op unless commit_every is set)
+                            session['commits'].flush(score_rows(session), write_scores)
                             st.session_state.current_sample += 1
                             st.rerun()
     
@@ -488,56 +474,52 @@ else:
                             st.error("Please provide a score between 1 and 5")
                         else:
                             # Save final evaluation
-                            st.session_state.evaluations[st.session_state.current_sample] = {
-                                'human_score': human_score
-                            }
+                            save_evaluation(session, human_score)
+                            flags = session['monitor'].flags
                             
                             try:
-                                # Write all evaluations to Google Sheets
-                                gc = get_gsheets_connection()
-                                sheet = gc.open_by_url(st.secrets["connections"]["gsheets"]["spreadsheet"])
-                                worksheet = sheet.worksheet("Score")
-                                
-                                # Prepare all rows to append
-                                rows_to_add = []
-                                for sample_idx, evaluation in st.session_state.evaluations.items():
-                                    sample_data = st.session_state.group_samples.iloc[sample_idx]
-                                    new_row = [
-                                        int(st.session_state.data_group),  # Convert to int
-                                        st.session_state.user_name, 
-                                        str(sample_data['dataId']),  # Convert to string
-                                        sample_data['reference'], 
-                                        sample_data['sentence'], 
-                                        str(sample_data['label']),  # Convert to string
-                                        sample_data['m1'], 
-                                        float(sample_data['s1']),  # Convert to float
-                                        sample_data['m2'], 
-                                        float(sample_data['s2']),  # Convert to float
-                                        sample_data['m3'], 
-                                        float(sample_data['s3']),  # Convert to float
-                                        int(evaluation['human_score'])  # Convert to int
-                                    ]
-                                    rows_to_add.append(new_row)
-                                
-                                # Append all rows at once
-                                if rows_to_add:
-                                    worksheet.append_rows(rows_to_add)
-
-                                gc = get_gsheets_connection()
-                                sheet = gc.open_by_url(st.secrets["connections"]["gsheets"]["spreadsheet"])
-                                worksheet = sheet.worksheet("Finished")
-                                worksheet.append_row([int(st.session_state.data_group), st.session_state.user_name])
+                                if flags:
+                                    # The first flagged session creates the sheet; fail here, before any Score rows are written
+                                    get_backend(project).ensure_sheet("Flagged", FLAGGED_COLUMNS)
+
+                                # Write the remaining evaluations through the project's write queue
+                                # and wait for every batch, so Finished is only marked once all have landed
+                                session['commits'].finish(score_rows(session), write_scores)
+
+                                # Record flagged sessions so their scores are left out of aggregates
+                                if flags:
+                                    append_rows(project, "Flagged", flagged_rows(
+                                        st.session_state.user_name,
+                                        session['sample_ids'],
+                                        flags
+                                    ))
+                                    if st.session_state.data_group == AUTO_GROUP:
+                                        # Not recorded, so hand the leased pairs back to the queue
+                                        get_sampler(project).release(session['sample_ids'])
+                                else:
+                                    # Every group's scores count towards retirement right away, not at the next rebuild
+                                    sampler = get_sampler(project)
+                                    for sample_idx, evaluation in session['evaluations'].items():
+                                        sample_data = store.row(session['sample_ids'][sample_idx])
+                                        if not is_gold(sample_data['dataId']) and evaluation['human_score']:
+                                            sampler.record(sample_data['dataId'], evaluation['human_score'])
+
+                                # Adaptive groups are not fixed slices, so only fixed groups are marked Finished
+                                if st.session_state.data_group != AUTO_GROUP:
+                                    append_rows(project, task['finished_sheet'], [[int(st.session_state.data_group), st.session_state.user_name]])
+                                    get_sheet_cache(project).invalidate(task['finished_sheet'])
                                 
                                 # Set a flag to show thank you page
                                 st.session_state.show_thank_you = True
                                 
                                 # Reset session state
                                 st.session_state.current_sample = 0
-                                st.session_state.evaluations = {}
                                 st.session_state.data_group = None
-                                st.session_state.group_samples = None
+                                st.session_state.timed_sample = None
+                                registry.drop(st.session_state.session_id)
                                 st.rerun()
                                 
                             except Exception as e:
+                                SUBMIT_ERRORS.inc(project, "semantic_match")
                                 st.error(f"Error saving evaluations: {str(e)}")
 
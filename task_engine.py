@@ -0,0 +1,347 @@
+"""Generic annotation page for the tasks defined in `tasks.py`.
+
+`run(name)` renders a whole task: instructions and example, the group/name form,
+one form per sample with the score slider and the metric rankings the task asks
+for, and the submit that writes the task's Score and Finished rows. Tasks in
+'pairwise' mode show two target sentences of one reference at a time instead,
+chosen by `pairwise.InsertionSort`. Every task reads the shared Data cache and
+group store and writes through the shared backend from `resources.py`, so any
+number of tasks can run in one process.
+
+Each task keeps its session state under its own key per project, so pages of
+different tasks and projects can be open in the same browser session.
+"""
+import pandas as pd
+import streamlit as st
+
+from monitoring import SUBMIT_ERRORS
+from pairwise import UNDO_WINDOW, replay
+from progressive import ProgressiveCommit
+from resources import (
+    append_rows, append_rows_async, current_project, get_backend, get_group_store, get_sheet_cache, get_tasks,
+    load_data, load_finished, track_rerun
+)
+from static_html import metric_card_html, text_box_html
+from tasks import score_row, validate
+
+FINISHED_COLUMNS = ['datagroup', 'user_name']
+
+
+def task_state(project, name):
+    """Session state of one task of a project (created on first use)."""
+    key = f"task_{project}_{name}"
+    if key not in st.session_state:
+        st.session_state[key] = {
+            'user_name': "",
+            'data_group': None,
+            'sample_ids': [],
+            'current_sample': 0,
+            'evaluations': {},
+            'commits': None,
+            'candidates': [],  # Pairwise mode: dataIds of the targets of each reference
+            'sorts': [],  # Pairwise mode: one InsertionSort per entry of `candidates`
+            'show_thank_you': False,
+        }
+    return st.session_state[key]
+
+
+@st.cache_resource
+def ensure_finished_sheet(project, sheetname):
+    """Create a task's Finished sheet once, so reads do not keep failing before the first submit."""
+    get_backend(project).ensure_sheet(sheetname, FINISHED_COLUMNS)
+
+
+def available_groups(project, task):
+    """Datagroups this task still needs annotated."""
+    groups = load_data(project, "Data")['datagroup'].dropna().astype(int)
+    finished = pd.to_numeric(load_finished(project, task['finished_sheet'])['datagroup'], errors='coerce')
+    return sorted(set(groups) - set(finished.dropna().astype(int)))
+
+
+def group_samples(project, task, datagroup):
+    """dataIds to annotate for a group: all of them, or only the first pair."""
+    sample_ids = list(get_group_store(project).group_ids(datagroup))
+    return sample_ids[:1] if task['samples'] == 'first' else sample_ids
+
+
+def comparison_candidates(project, sample_ids):
+    """dataIds of the target sentences of each reference that has more than one."""
+    store = get_group_store(project)
+    by_reference = {}
+    for data_id in sample_ids:
+        by_reference.setdefault(str(store.row(data_id)['reference']), []).append(data_id)
+    return [candidates for candidates in by_reference.values() if len(candidates) > 1]
+
+
+def score_rows(project, task, state):
+    """Score rows of the completed samples (pairwise mode: of the judgments), by index."""
+    if task['mode'] == 'pairwise':
+        return {
+            index: score_row(task, state['user_name'], state['data_group'], judgment, judgment)
+            for index, judgment in sorted(state['evaluations'].items())
+        }
+    store = get_group_store(project)
+    return {
+        sample_idx: score_row(task, state['user_name'], state['data_group'], store.row(state['sample_ids'][sample_idx]), evaluation)
+        for sample_idx, evaluation in sorted(state['evaluations'].items())
+        if validate(task, evaluation) is None
+    }
+
+
+def commit_progress(project, task, state):
+    """Write a batch of completed samples once `commit_every` have piled up."""
+    rows = score_rows(project, task, state)
+    if task['mode'] == 'pairwise':
+        # Judgments that can still be undone are kept back until the final submit
+        rows = dict(sorted(rows.items())[:-UNDO_WINDOW])
+    state['commits'].flush(rows, lambda batch: append_rows_async(project, task['score_sheet'], batch))
+
+
+def submit(project, task, state):
+    """Write the remaining Score rows, then the Finished row once every batch has landed."""
+    state['commits'].finish(
+        score_rows(project, task, state),
+        lambda rows: append_rows_async(project, task['score_sheet'], rows)
+    )
+    if task['finished_sheet']:
+        append_rows(project, task['finished_sheet'], [[state['data_group'], state['user_name']]])
+        get_sheet_cache(project).invalidate(task['finished_sheet'])
+
+
+# --- Page sections ---
+def show_thank_you(state):
+    st.empty()
+    st.balloons()
+    st.markdown("""
+    <div style="text-align: center;">
+        <h1>Thank You!</h1>
+        <h3>Your contributions are invaluable to our research!</h3>
+        <p>All your evaluations have been successfully recorded.</p>
+        <p style="margin-bottom: 40px;">We sincerely appreciate your time and effort.</p>
+        <p style="font-style: italic; margin-bottom: 30px;">- The HealthNLP Research Team</p>
+    </div>
+    """, unsafe_allow_html=True)
+    if st.button("Start New Evaluation", type="primary"):
+        state['show_thank_you'] = False
+        st.rerun()
+
+
+def show_example(task):
+    example = task['example']
+    st.markdown("#### Example before the Evaluation Task:")
+    st.markdown("Before you start, here’s an example to help you understand the evaluation process.")
+    with st.container(border=True):
+        st.markdown("**Reference**")
+        st.markdown(text_box_html(example['reference'], 'reference'), unsafe_allow_html=True)
+        st.markdown("**Target Sentence**")
+        st.markdown(text_box_html(example['sentence'], 'target'), unsafe_allow_html=True)
+        st.markdown(f"#### Task 1: Alignment Score ({task['score_range'][0]}-{task['score_range'][1]})")
+        st.markdown(f"Selected: **{example['human_score']}**")
+        st.markdown(f"**Explanation**: {example['explanation']}")
+        if task['ranks']:
+            st.markdown("#### Task 2: Metric Ranking")
+            st.markdown("*Metrics are scored on a 0-1 scale where higher values indicate better alignment*")
+            for col, (label, _) in zip(st.columns(len(task['ranks'])), task['ranks']):
+                with col:
+                    st.markdown(metric_card_html(label, example['scores'][label]), unsafe_allow_html=True)
+                    st.markdown(f"Rank: **{example['ranks'][label]}**")
+    st.markdown("---")
+
+
+def show_load_form(project, name, task, state):
+    with st.form(f"{name}_user_input"):
+        col1, col2 = st.columns(2)
+        with col1:
+            data_group = st.selectbox("Data Group", [''] + available_groups(project, task), key=f"{name}_datagroup_select")
+        with col2:
+            user_name = st.text_input("Your Name", value=state['user_name'], key=f"{name}_name_input")
+        submitted = st.form_submit_button("Load Data")
+
+    if submitted and data_group != '' and user_name:
+        sample_ids = group_samples(project, task, data_group)
+        candidates = comparison_candidates(project, sample_ids) if task['mode'] == 'pairwise' else []
+        if task['mode'] == 'pairwise' and not candidates:
+            st.warning("This group has no reference with more than one target sentence to compare.")
+            return
+        state.update(
+            user_name=user_name,
+            data_group=int(data_group),
+            sample_ids=sample_ids,
+            current_sample=0,
+            evaluations={},
+            commits=ProgressiveCommit(task['commit_every']),
+            candidates=candidates,
+            sorts=replay(candidates, []),
+        )
+        st.rerun()
+
+
+def rank_inputs(name, task, state, row, current_eval):
+    """Metric cards with a rank selectbox each; returns {'A_rank': value, ...}."""
+    labels = list(task['rank_labels'])
+    values = list(task['rank_labels'].values())
+    ranks = {}
+    for col, (label, column) in zip(st.columns(len(task['ranks'])), task['ranks']):
+        with col:
+            st.markdown(metric_card_html(label, row[column]), unsafe_allow_html=True)
+            current_value = current_eval.get(f"{label}_rank", '')
+            choice = st.selectbox(
+                f"Rank Metric {label}",
+                labels,
+                key=f"{name}_{label}_rank_{state['current_sample']}",
+                index=values.index(current_value) if current_value in values else 0,
+                label_visibility="collapsed"
+            )
+            ranks[f"{label}_rank"] = task['rank_labels'][choice]
+    return ranks
+
+
+def show_evaluation_form(project, name, task, state):
+    sample_idx = state['current_sample']
+    total = len(state['sample_ids'])
+    st.progress(sample_idx / total)
+    st.caption(f"Sample {sample_idx + 1} of {total}")
+    row = get_group_store(project).row(state['sample_ids'][sample_idx])
+    current_eval = state['evaluations'].get(sample_idx, {})
+    low, high = task['score_range']
+
+    with st.form(f"{name}_evaluation_form_{sample_idx}"):
+        st.markdown("**Reference**")
+        st.markdown(text_box_html(row['reference'], 'reference'), unsafe_allow_html=True)
+        st.markdown("**Target Sentence**")
+        st.markdown(text_box_html(row['sentence'], 'target'), unsafe_allow_html=True)
+
+        st.markdown(f"#### Task 1: Alignment Score ({low}-{high})")
+        st.markdown("**How well does the target sentence match the reference?**")
+        human_score = st.slider(
+            f"Score ({low}-{high})",
+            0, high,
+            value=current_eval.get('human_score', 0),
+            key=f"{name}_human_score_{sample_idx}",
+            label_visibility="collapsed"
+        )
+        evaluation = {'human_score': human_score}
+
+        if task['ranks']:
+            st.markdown("#### Task 2: Metric Ranking")
+            st.markdown("**Which metric best reflects alignment between the reference and target sentence?**")
+            evaluation.update(rank_inputs(name, task, state, row, current_eval))
+
+        cols = st.columns([3, 1, 1])
+        with cols[1]:
+            if sample_idx > 0 and st.form_submit_button("⏮ Previous"):
+                state['evaluations'][sample_idx] = evaluation
+                state['current_sample'] -= 1
+                st.rerun()
+        with cols[2]:
+            last = sample_idx == total - 1
+            if st.form_submit_button("Submit All" if last else "Next ⏭"):
+                error = validate(task, evaluation)
+                if error:
+                    st.error(error)
+                    return
+                state['evaluations'][sample_idx] = evaluation
+                if not last:
+                    commit_progress(project, task, state)
+                    state['current_sample'] += 1
+                    st.rerun()
+                try:
+                    submit(project, task, state)
+                except Exception as e:
+                    SUBMIT_ERRORS.inc(project, name)
+                    st.error(f"Error saving evaluations: {str(e)}")
+                    return
+                state.update(
+                    show_thank_you=True, data_group=None, sample_ids=[], current_sample=0, evaluations={}, commits=None
+                )
+                st.rerun()
+
+
+def show_comparison_form(project, name, task, state):
+    """Pairwise mode: the next two targets to compare, until every reference's targets are ranked."""
+    sorts = state['sorts']
+    index = next((i for i, sort in enumerate(sorts) if not sort.done()), None)
+    if index is None:
+        # Everything is ranked but saving failed; let the annotator try again
+        st.info("All target sentences are ranked.")
+        if st.button("Submit All", key=f"{name}_submit_comparisons"):
+            finish_comparisons(project, name, task, state)
+        return
+    done = len(state['evaluations'])
+    left = sum(sort.comparisons_left() for sort in sorts)
+    st.progress(done / (done + left))
+    st.caption(f"Comparison {done + 1}, at most {left - 1} more after this one")
+
+    candidate, other = sorts[index].comparison()
+    # Alternate the sides so position does not decide which target wins
+    shown = [candidate, other] if done % 2 == 0 else [other, candidate]
+    store = get_group_store(project)
+    st.markdown("**Reference**")
+    st.markdown(text_box_html(store.row(candidate)['reference'], 'reference'), unsafe_allow_html=True)
+    st.markdown("**Which target sentence matches the reference better?**")
+
+    preferred = None
+    for col, label, data_id in zip(st.columns(2), ["A", "B"], shown):
+        with col:
+            st.markdown(f"**Target {label}**")
+            st.markdown(text_box_html(store.row(data_id)['sentence'], 'target'), unsafe_allow_html=True)
+            if st.button(f"Target {label} is closer", key=f"{name}_prefer_{label}_{done}", use_container_width=True):
+                preferred = data_id
+
+    # Written judgments stay in the sheet, so only those not written yet can be undone
+    undoable = done > 0 and done - 1 not in state['commits'].committed
+    if undoable and st.button("⏮ Undo last answer", key=f"{name}_undo_{done}"):
+        del state['evaluations'][done - 1]
+        state['sorts'] = replay(
+            state['candidates'], [(j['sort'], j['preferred']) for _, j in sorted(state['evaluations'].items())]
+        )
+        st.rerun()
+
+    if preferred is None:
+        return
+    state['evaluations'][done] = {'dataId': candidate, 'other_dataId': other, 'preferred': preferred, 'sort': index}
+    sorts[index].record(preferred)
+    if not all(sort.done() for sort in sorts):
+        commit_progress(project, task, state)
+        st.rerun()
+    finish_comparisons(project, name, task, state)
+
+
+def finish_comparisons(project, name, task, state):
+    try:
+        submit(project, task, state)
+    except Exception as e:
+        SUBMIT_ERRORS.inc(project, name)
+        st.error(f"Error saving evaluations: {str(e)}")
+        return
+    state.update(
+        show_thank_you=True, data_group=None, sample_ids=[], current_sample=0, evaluations={}, commits=None,
+        candidates=[], sorts=[]
+    )
+    st.rerun()
+
+
+def run(name):
+    """Render the page of task `name`."""
+    project = current_project()
+    track_rerun(name)
+    task = get_tasks(project)[name]
+    state = task_state(project, name)
+    if task['finished_sheet']:
+        ensure_finished_sheet(project, task['finished_sheet'])
+
+    if state['show_thank_you']:
+        show_thank_you(state)
+        return
+
+    st.title(f"📊 {task['title']}")
+    if state['data_group'] is None:
+        if task['instructions']:
+            st.markdown(task['instructions'], unsafe_allow_html=True)
+        if task['example']:
+            show_example(task)
+        show_load_form(project, name, task, state)
+    elif task['mode'] == 'pairwise':
+        show_comparison_form(project, name, task, state)
+    else:
+        show_evaluation_form(project, name, task, state)
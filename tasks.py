@@ -0,0 +1,186 @@
+"""Declarative definitions of the annotation tasks served by `annotate.py`.
+
+Each task names the sheets it writes, the columns of its Score rows, the score
+scale and which metric scores (if any) are ranked. Tasks in 'pairwise' mode
+instead ask which of two target sentences matches the reference better (see
+`pairwise.py`). The generic pages in
+`task_engine.py` are driven entirely by these definitions; the semantic match
+task keeps its own page (`streamlit_app.py`) for active sampling and gold items.
+
+Sheet names can be overridden per deployment in the secrets, e.g. to keep a
+variant writing to the sheets it used before, or to write completed samples
+every few samples instead of all at the end (see `progressive.py`):
+
+    [tasks.score_and_rank]
+    score_sheet = "Score"
+    finished_sheet = "Finished"
+    commit_every = 3
+"""
+from schema import PAIRWISE_SCORE_SHEET_COLUMNS, RANKED_SCORE_SHEET_COLUMNS, SCORE_SHEET_COLUMNS
+
+# Display label -> stored rank
+RANK_LABELS = {
+    '': '',
+    'Most Accurate': 1,
+    'In-Between': 2,
+    'Least Accurate': 3
+}
+RANK_NUMBERS = {'': '', '1': 1, '2': 2, '3': 3}
+
+# Metric shown as "Metric A" is scored in column s1, and so on
+RANKED_METRICS = [('A', 's1'), ('B', 's2'), ('C', 's3')]
+
+RANK_INSTRUCTIONS = """
+<div style="background:#f0f8ff; padding:15px; border-radius:10px; margin-bottom:20px;">
+    <p><strong>Instructions:</strong> You will receive a <strong>reference</strong> and a <strong>target sentence</strong>. Your goal is to assess the similarity between the two sentences by completing the following tasks:</p>
+    <ol>
+        <li><strong>Task 1:</strong> Evaluate the alignment between the <strong>reference</strong> and <strong>target sentence</strong>. Assign a score from 0 to 5 based on how well the two sentences align:
+            <ul>
+                <li> 0-1 Weak alignment</li>
+                <li> 2-3 Partial alignment</li>
+                <li> 4-5 Strong alignment</li>
+            </ul>
+        </li>
+        <li><strong>Task 2:</strong> You will be presented with three metric scores that assess the alignment between the sentences. Your task is to rank these three scores based on how accurately they reflect the similarity between the <strong>reference</strong> and <strong>target sentence</strong>:
+            <ul>
+                <li> Most accurate </li>
+                <li> In-between </li>
+                <li> Least accurate </li>
+            </ul>
+        </li>
+    </ol>
+</div>
+"""
+
+PAIRWISE_INSTRUCTIONS = """
+<div style="background:#f0f8ff; padding:15px; border-radius:10px; margin-bottom:20px;">
+    <p><strong>Instructions:</strong> You will see a <strong>reference</strong> and two <strong>target sentences</strong>. Choose the target sentence whose meaning matches the reference better. The next pair is chosen from your earlier answers, so every target sentence of the reference ends up ranked with as few comparisons as possible.</p>
+</div>
+"""
+
+RANK_EXAMPLE = {
+    'reference': "The watermelon seeds pass through your digestive system.",
+    'sentence': "You grow watermelons in your stomach.",
+    'human_score': 1,
+    'explanation': "The sentences share similar elements (watermelon seeds and stomach) but convey different meanings, leading to a score of 1 (weak alignment).",
+    'scores': {'A': 0.22, 'B': 0.57, 'C': 0.63},
+    'ranks': {'A': 'Most Accurate', 'B': 'In-Between', 'C': 'Least Accurate'},
+}
+
+TASKS = {
+    # streamlit_app.py: whole datagroups or actively sampled pairs, one 1-5 score each
+    'semantic_match': {
+        'title': "Semantic Match",
+        'page': "streamlit_app.py",
+        'score_sheet': "Score",
+        'finished_sheet': "Finished",
+        'columns': SCORE_SHEET_COLUMNS,
+        'mode': 'score',
+        'commit_every': None,  # Write only at "Submit All"
+        'score_range': (1, 5),
+        'ranks': None,
+    },
+    # streamlit_app_v2.py: every pair of a datagroup, a 0-5 score and a ranking of metrics A/B/C
+    'score_and_rank': {
+        'title': "Score and Rank Metrics",
+        'page': None,
+        'score_sheet': "Score_rank",
+        'finished_sheet': "Finished_rank",
+        'columns': RANKED_SCORE_SHEET_COLUMNS,
+        'mode': 'score',
+        'commit_every': None,
+        'score_range': (0, 5),
+        'ranks': RANKED_METRICS,
+        'rank_labels': RANK_LABELS,
+        'unique_ranks': False,
+        'samples': 'group',
+        'instructions': RANK_INSTRUCTIONS,
+        'example': RANK_EXAMPLE,
+    },
+    # streamlit_app_v1.py: the first pair of a datagroup, ties between ranks allowed
+    'rank_first_pair': {
+        'title': "Rank Metrics",
+        'page': None,
+        'score_sheet': "Score_rank_first",
+        'finished_sheet': None,  # Groups stay available to every annotator
+        'columns': RANKED_SCORE_SHEET_COLUMNS,
+        'mode': 'score',
+        'commit_every': None,
+        'score_range': (0, 5),
+        'ranks': RANKED_METRICS,
+        'rank_labels': RANK_NUMBERS,
+        'unique_ranks': False,
+        'samples': 'first',
+        'instructions': None,
+        'example': None,
+    },
+    # streamlit_app_v0.py: as above, but each rank may only be given once
+    'rank_first_pair_unique': {
+        'title': "Rank Metrics (unique ranks)",
+        'page': None,
+        'score_sheet': "Score_rank_unique",
+        'finished_sheet': None,
+        'columns': RANKED_SCORE_SHEET_COLUMNS,
+        'mode': 'score',
+        'commit_every': None,
+        'score_range': (0, 5),
+        'ranks': RANKED_METRICS,
+        'rank_labels': RANK_NUMBERS,
+        'unique_ranks': True,
+        'samples': 'first',
+        'instructions': None,
+        'example': None,
+    },
+    # Which of two target sentences matches the reference better, until all targets of a reference are ranked
+    'pairwise': {
+        'title': "Compare Target Sentences",
+        'page': None,
+        'score_sheet': "Score_pairwise",
+        'finished_sheet': "Finished_pairwise",
+        'columns': PAIRWISE_SCORE_SHEET_COLUMNS,
+        'mode': 'pairwise',
+        'commit_every': 5,
+        'score_range': None,
+        'ranks': None,
+        'samples': 'group',
+        'instructions': PAIRWISE_INSTRUCTIONS,
+        'example': None,
+    },
+}
+
+
+def configured_tasks(overrides):
+    """TASKS with the per-task settings of the `[tasks]` secrets section applied."""
+    return {name: {**task, **overrides.get(name, {})} for name, task in TASKS.items()}
+
+
+def validate(task, evaluation):
+    """Error message for an incomplete evaluation, None if it can be saved."""
+    if task['mode'] == 'pairwise':
+        return None if evaluation.get('preferred') else "Please choose one of the target sentences"
+    low, high = task['score_range']
+    if not low <= evaluation['human_score'] <= high:
+        return f"Please provide a score between {low} and {high}"
+    if task['ranks']:
+        ranks = [evaluation[f"{label}_rank"] for label, _ in task['ranks']]
+        if not all(ranks):
+            return "Please rank all metrics"
+        if task['unique_ranks'] and len(set(ranks)) < len(ranks):
+            return "Ranks must be unique"
+    return None
+
+
+def score_row(task, user_name, datagroup, row, evaluation):
+    """One Score row in the task's column layout (Data rows are already typed by `validate_data()`)."""
+    values = {
+        'datagroup': datagroup,
+        'user_name': user_name,
+        'dataId': row['dataId'],
+        **evaluation,
+    }
+    return [values[column] for column in task['columns']]
+
+
+def score_sheets(tasks):
+    """Score sheet of every task with its column layout (each is sharded on its own)."""
+    return {task['score_sheet']: task['columns'] for task in tasks.values()}
@@ -0,0 +1,65 @@
+"""Token-level differences between a reference and a target sentence, as HTML.
+
+Tokens only in the reference are marked as deleted, tokens only in the target as
+inserted, and replaced runs as changed in both boxes. The app builds the HTML of
+a datagroup's pairs once, when the group is loaded (`group_diffs`), and keeps it
+with the session keyed by dataId, so turning highlighting on or moving between
+samples never diffs again and memory is bounded by the loaded groups.
+"""
+import difflib
+import html
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]+|\s+")
+
+DIFF_CLASSES = {
+    'delete': "diff-del",
+    'insert': "diff-ins",
+    'replace': "diff-chg",
+}
+
+DIFF_CSS = """
+<style>
+    .diff-del { background: #fde2e1; text-decoration: line-through; text-decoration-color: #e15759; }
+    .diff-ins { background: #dff3e3; }
+    .diff-chg { background: #fff1c7; }
+</style>
+"""
+
+
+def tokenize(text):
+    """Words, punctuation runs and whitespace, so joining the tokens gives back the text."""
+    return TOKEN_PATTERN.findall(text)
+
+
+def _render(tokens, opcodes, side):
+    parts = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        start, end = (i1, i2) if side == 'a' else (j1, j2)
+        text = html.escape("".join(tokens[start:end]))
+        if not text:
+            continue
+        if tag == 'equal' or not text.strip():
+            parts.append(text)
+        else:
+            parts.append(f'<span class="{DIFF_CLASSES[tag]}">{text}</span>')
+    return "".join(parts)
+
+
+def token_diff_html(reference, sentence):
+    """(reference_html, sentence_html) with deleted, inserted and changed tokens marked."""
+    a = tokenize(reference)
+    b = tokenize(sentence)
+    # Compare case-insensitively; whitespace tokens never make a difference on their own
+    matcher = difflib.SequenceMatcher(lambda token: token.isspace(), [t.lower() for t in a], [t.lower() for t in b],
+                                      autojunk=False)
+    opcodes = matcher.get_opcodes()
+    return _render(a, opcodes, 'a'), _render(b, opcodes, 'b')
+
+
+def group_diffs(rows):
+    """{dataId: (reference_html, sentence_html)} for the rows of a loaded group."""
+    return {
+        str(row['dataId']): token_diff_html(str(row['reference']), str(row['sentence']))
+        for row in rows
+    }
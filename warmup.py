@@ -0,0 +1,158 @@
+"""Warm the caches before traffic arrives and report readiness over HTTP.
+
+    python warmup.py streamlit_app.py --ready-port 8502 -- --server.port 8501
+
+Starts a small readiness server and a warm-up thread that authenticates, loads
+and indexes the Data and Finished sheets and pre-renders the static HTML, then
+runs Streamlit in this same process so sessions find the caches already warm.
+
+    GET /ready   200 once the warm-up has finished, 503 before (for the load balancer)
+    GET /health  200 while the process is up
+    GET /sync    sync state of every project using a local store (see local_store.py)
+    GET /metrics Prometheus metrics of the app (see monitoring.py)
+
+With --metrics-textfile the metrics are also written to a file every
+--metrics-interval seconds, for node_exporter's textfile collector.
+"""
+import argparse
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import monitoring
+
+logger = logging.getLogger(__name__)
+
+RETRY_SECONDS = 30
+
+_status = {'ready': False, 'stages': {}, 'error': None}
+_start_lock = threading.Lock()
+_started = False
+
+
+def warm_up():
+    """Run every warm-up stage once for every project, recording how long each took."""
+    import streamlit as st
+
+    import resources
+    import static_html
+    from projects import project_names
+
+    stages = []
+    for project in project_names(st.secrets):
+        finished = resources.get_tasks(project)['semantic_match']['finished_sheet']
+        prefix = f"{project}/" if project != "default" else ""
+        stages += [
+            # Every backend has header(); for Sheets it authenticates and opens the spreadsheet
+            (prefix + 'authenticate', lambda project=project: resources.get_backend(project).header("Data")),
+            (prefix + 'load_sheets', lambda project=project: resources.load_sheets(project, "Data", finished)),
+            (prefix + 'group_store', functools.partial(resources.get_group_store, project)),
+            (prefix + 'sampler', functools.partial(resources.get_sampler, project)),
+        ]
+    stages.append(('static_html', static_html.prerender))
+    for name, stage in stages:
+        started = time.perf_counter()
+        stage()
+        _status['stages'][name] = round(time.perf_counter() - started, 3)
+
+
+def _warm_up_until_ready():
+    # Keep retrying so a replica started during a Sheets outage becomes ready on its own
+    while not _status['ready']:
+        try:
+            warm_up()
+            _status['error'] = None
+            _status['ready'] = True
+        except Exception as e:
+            _status['error'] = str(e)
+            logger.exception("Warm-up failed, retrying in %ss", RETRY_SECONDS)
+            time.sleep(RETRY_SECONDS)
+
+
+def is_ready():
+    return _status['ready']
+
+
+def sync_status():
+    """Outbox and pull state of every project with a local store, once warmed up."""
+    if not _status['ready']:
+        return {}
+    import streamlit as st
+
+    import resources
+    from projects import project_names
+
+    status = {}
+    for project in project_names(st.secrets):
+        sync = getattr(resources.get_backend(project), 'sync', None)
+        if sync is not None:
+            status[project] = sync.status()
+    return status
+
+
+class ReadinessHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send(200, monitoring.render().encode(), 'text/plain; version=0.0.4; charset=utf-8')
+            return
+        payload = _status
+        if self.path == '/ready':
+            code = 200 if _status['ready'] else 503
+        elif self.path == '/health':
+            code = 200
+        elif self.path == '/sync':
+            code, payload = 200, sync_status()
+        else:
+            self.send_error(404)
+            return
+        self._send(code, json.dumps(payload).encode(), 'application/json')
+
+    def _send(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Probes hit this every few seconds; keep them out of the logs
+
+
+def start(ready_port=8502):
+    """Start the readiness server and the warm-up thread (once per process)."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    server = ThreadingHTTPServer(('', ready_port), ReadinessHandler)
+    threading.Thread(target=server.serve_forever, name="readiness", daemon=True).start()
+    threading.Thread(target=_warm_up_until_ready, name="warm-up", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a Streamlit app with cache warm-up and a readiness probe.")
+    parser.add_argument("script", help="App script, e.g. streamlit_app.py")
+    parser.add_argument("--ready-port", type=int, default=8502, help="Port for /ready, /health and /metrics")
+    parser.add_argument("--metrics-textfile", help="Also write the metrics to this file (node_exporter textfile collector)")
+    parser.add_argument("--metrics-interval", type=float, default=15, help="Seconds between metrics file writes")
+    parser.add_argument("streamlit_args", nargs=argparse.REMAINDER, help="Arguments passed on to `streamlit run`")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    start(args.ready_port)
+    if args.metrics_textfile:
+        monitoring.start_textfile_writer(args.metrics_textfile, args.metrics_interval)
+
+    from streamlit.web import cli as stcli
+    streamlit_args = [arg for arg in args.streamlit_args if arg != '--']
+    sys.argv = ["streamlit", "run", args.script, *streamlit_args]
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    main()